@@ -1,22 +1,41 @@
 from airflow import DAG
-from airflow.operators.bash import BashOperator
+from airflow.models import Variable
+from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
-from datetime import datetime
+import json
+import urllib.request
 
 default_args = {
     'owner': 'airflow',
     'start_date': days_ago(1),
 }
 
+
+def trigger_strike_tick(**kwargs):
+    # The resident strike service (kafka/strike_service.py) keeps Spark and its
+    # Postgres pool warm, a tick only processes the messages since the last one
+    url = Variable.get('strike_service_url', default_var='http://127.0.0.1:8091')
+    request = urllib.request.Request(
+        f"{url}/tick",
+        data=b"",
+        method="POST",
+        headers={"X-Tick-Reason": f"cooldown_dag {kwargs['run_id']}"},
+    )
+    with urllib.request.urlopen(request, timeout=1800) as response:
+        result = json.loads(response.read())
+    print(f"Strike tick finished in {result['seconds']:.2f}s, {result['cooled']} employees cooled down")
+
+
 with DAG(
     dag_id='cooldown_dag',
     default_args=default_args,
     schedule_interval='*/7 * * * *',  # Runs at every 7th mint
     catchup=False,
+    max_active_runs=1,
     tags=['local', 'monthly'],
 ) as dag:
 
-    run_local_script = BashOperator(
-        task_id='run_local_python_script',
-        bash_command="""source ~/venv/bin/activate && python /home/ubuntu/capstone/bootcamp-project/kafka/final_code2.py""",
+    run_strike_tick = PythonOperator(
+        task_id='run_strike_tick',
+        python_callable=trigger_strike_tick,
     )
@@ -1,11 +1,14 @@
 from airflow import DAG
 from airflow.models import Variable
-from airflow.operators.python import BranchPythonOperator
+from airflow.operators.python import BranchPythonOperator, ShortCircuitOperator
 from airflow.operators.dummy import DummyOperator
 from airflow.utils.dates import days_ago
 from airflow.utils.trigger_rule import TriggerRule
 from airflow.providers.amazon.aws.operators.glue import GlueJobOperator
 from datetime import datetime
+from functools import partial
+
+from change_detection import inputs_changed, record_fingerprint
 
 def schedule_branch(**kwargs):
     date = kwargs['execution_date']
@@ -24,6 +27,28 @@ def schedule_branch(**kwargs):
     return branches
 
 
+def daily_glue_job(job_name, trigger_rule=TriggerRule.ALL_SUCCESS):
+    # Skip the Glue job when its inputs match the last successful run. Only the
+    # job itself is skipped, downstream checks look at their own inputs, which
+    # are unchanged when the upstream job did not write anything.
+    check = ShortCircuitOperator(
+        task_id=f'check_{job_name}',
+        python_callable=inputs_changed,
+        op_kwargs={'job_name': job_name, 'script_args': script_args},
+        ignore_downstream_trigger_rules=False,
+        trigger_rule=trigger_rule,
+    )
+    run = GlueJobOperator(
+        task_id=f'run_{job_name}',
+        job_name=job_name,
+        region_name='us-east-1',
+        script_args=script_args,
+        on_success_callback=partial(record_fingerprint, job_name, f'check_{job_name}'),
+    )
+    check >> run
+    return check, run
+
+
 default_args = {
     'owner': 'airflow',
     'start_date': days_ago(1),
@@ -40,6 +65,8 @@ script_args = {
     '--start_of_year': Variable.get('start_of_year'),
     '--today': Variable.get('today'),
     '--CURRENT_YEAR': Variable.get('CURRENT_YEAR'),
+    # zip of the shared common/ package used by the Glue scripts
+    '--extra-py-files': Variable.get('common_py_files'),
 }
 with DAG(
     dag_id='glue_job_dags',
@@ -49,47 +76,22 @@ with DAG(
     tags=['aws', 'glue'],
 ) as dag:
 
-    daily_check_done = DummyOperator(task_id='daily_check_done')
+    # Runs when every daily job either succeeded or was skipped as unchanged
+    daily_check_done = DummyOperator(task_id='daily_check_done', trigger_rule=TriggerRule.NONE_FAILED)
 
     # ---------------- DAILY JOBS ----------------
-    run_emp_data = GlueJobOperator(
-        task_id='run_gp4_emp_data_transformation',
-        job_name='gp4_emp_data_transformation',
-        region_name='us-east-1',
-        script_args=script_args,
-    )
-
-    run_emp_time = GlueJobOperator(
-        task_id='run_gp4_emp_time_data_transformation',
-        job_name='gp4_emp_time_data_transformation',
-        region_name='us-east-1',
-        script_args=script_args,
-    )
-
-    run_emp_leave = GlueJobOperator(
-        task_id='run_gp4_emp_leave_data',
-        job_name='gp4_emp_leave_data',
-        region_name='us-east-1',
-        script_args=script_args,
-    )
+    check_emp_data, run_emp_data = daily_glue_job('gp4_emp_data_transformation')
+    check_emp_time, run_emp_time = daily_glue_job('gp4_emp_time_data_transformation')
+    check_emp_leave, run_emp_leave = daily_glue_job('gp4_emp_leave_data')
 
-    run_upcoming_leave = GlueJobOperator(
-        task_id='run_gp4_emp_upcoming_leave_check',
-        job_name='gp4_emp_upcoming_leave_check',
-        region_name='us-east-1',
-        trigger_rule=TriggerRule.ALL_SUCCESS,
-        script_args=script_args,
-    )
+    # Downstream checks also run after a skipped upstream job
+    check_upcoming_leave, run_upcoming_leave = daily_glue_job('gp4_emp_upcoming_leave_check', TriggerRule.NONE_FAILED)
+    check_daily_report, run_daily_report = daily_glue_job('gp4_daily_active_employee_report', TriggerRule.NONE_FAILED)
 
-    run_daily_report = GlueJobOperator(
-        task_id='run_gp4_daily_active_employee_report',
-        job_name='gp4_daily_active_employee_report',
-        region_name='us-east-1',
-        trigger_rule=TriggerRule.ALL_SUCCESS,
-        script_args=script_args,
-    )
     # Set daily dependencies
-    [run_emp_data, run_emp_time, run_emp_leave] >> run_upcoming_leave >> run_daily_report >> daily_check_done
+    [run_emp_data, run_emp_time, run_emp_leave] >> check_upcoming_leave
+    run_upcoming_leave >> check_daily_report
+    run_daily_report >> daily_check_done
 
     # ---------------- SCHEDULE CHECK ----------------
     schedule_check = BranchPythonOperator(
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.emp_history import EmployeeHistoryIndex
+
+# Queries per second of the point-in-time salary/designation lookups, on synthetic
+# SCD2 histories, against a full scan of the rows per query (what an ad-hoc
+# lookup on emp_time_data amounts to without the index). No Postgres needed.
+# Usage: python benchmark_emp_history.py [history_rows...]
+sizes = [int(n) for n in sys.argv[1:]] or [100_000, 10_000_000]
+records_per_employee = 5
+single_queries = 20_000
+batch_queries = 1_000_000
+scan_queries = 20
+designations = ["Engineer", "Senior Engineer", "Lead", "Manager", "Director"]
+first_day = np.datetime64("2015-01-01")
+
+
+def make_history(n, seed=42):
+    rng = np.random.default_rng(seed)
+    employees = max(1, n // records_per_employee)
+    emp_id = np.repeat(np.arange(1, employees + 1, dtype=np.int64), records_per_employee)[:n]
+    position = np.tile(np.arange(records_per_employee), employees)[:n]
+    # Back-to-back records per employee: each ends the day its successor starts
+    offsets = np.cumsum(rng.integers(30, 400, size=(employees, records_per_employee)), axis=1).ravel()[:n]
+    starts = first_day + offsets.astype("timedelta64[D]")
+    ends = np.append(starts[1:], np.datetime64("NaT"))
+    last = np.append(emp_id[1:] != emp_id[:-1], True)
+    ends[last] = np.datetime64("NaT")
+    history = pd.DataFrame({
+        "emp_id": emp_id,
+        "designation": np.array(designations)[np.minimum(position, len(designations) - 1)],
+        "start_date": starts,
+        "end_date": ends,
+        "salary": rng.integers(30_000, 200_000, size=n),
+        "status": np.where(last, "ACTIVE", "INACTIVE"),
+    })
+    events = n // 10
+    strikes = pd.DataFrame({
+        "sender": rng.integers(1, employees + 1, size=events),
+        "event_ts": rng.integers(int(first_day.astype("datetime64[s]").astype(np.int64)), 1_800_000_000, size=events),
+        "delta": np.ones(events, dtype=np.int64),
+        "event_id": np.arange(events),
+    })
+    return history, strikes, employees
+
+
+def make_queries(rng, employees, n):
+    emp_ids = rng.integers(1, employees + 1, size=n)
+    days = first_day + rng.integers(0, 3650, size=n).astype("timedelta64[D]")
+    return emp_ids, days
+
+
+def scan_lookup(history, emp_id, day):
+    rows = history[(history["emp_id"].to_numpy() == emp_id) & (history["start_date"].to_numpy() <= day)
+                   & ((history["end_date"].to_numpy() > day) | history["end_date"].isna().to_numpy())]
+    return rows.iloc[0] if len(rows) else None
+
+
+print(f"{'rows':>10} {'build_s':>8} {'scan_qps':>10} {'single_qps':>11} {'batch_qps':>12} {'found':>6}")
+for n in sizes:
+    history, strikes, employees = make_history(n)
+    rng = np.random.default_rng(7)
+
+    start = time.perf_counter()
+    index = EmployeeHistoryIndex(history, strikes)
+    build_s = time.perf_counter() - start
+
+    emp_ids, days = make_queries(rng, employees, scan_queries)
+    start = time.perf_counter()
+    expected = [scan_lookup(history, emp_id, day) for emp_id, day in zip(emp_ids, days)]
+    scan_qps = scan_queries / (time.perf_counter() - start)
+    # Checked outside the timing, the scan answers are the reference for the index
+    for emp_id, day, scanned in zip(emp_ids, days, expected):
+        found = index.lookup(emp_id, day)
+        if (scanned is None) != (found is None) or (found and found["salary"] != scanned["salary"]):
+            print(f"Mismatch for employee {emp_id} on {day}: scan={scanned} index={found}")
+
+    emp_ids, days = make_queries(rng, employees, single_queries)
+    start = time.perf_counter()
+    for emp_id, day in zip(emp_ids, days):
+        index.lookup(emp_id, day)
+    single_qps = single_queries / (time.perf_counter() - start)
+
+    emp_ids, days = make_queries(rng, employees, batch_queries)
+    start = time.perf_counter()
+    result = index.lookup_many(emp_ids, days)
+    batch_qps = batch_queries / (time.perf_counter() - start)
+    found = result["salary"].notna().mean()
+
+    print(f"{n:>10} {build_s:>8.2f} {scan_qps:>10.0f} {single_qps:>11.0f} {batch_qps:>12.0f} {found:>6.1%}")
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Synthetic inputs for the Glue jobs at a multiple of the sample sizes in Dataset/
+# (100k employees, 2 quota years, 20 holidays a year). Files land in the bronze
+# layout the jobs read from S3, one folder per simulated day:
+#   <out>/day1/bronze/emp_data/unprocessed/employee_data.csv
+#   <out>/day2/bronze/emp_time_data/unprocessed/employee_timeframe_data_1.csv
+#   <out>/manifest.json
+# Usage: python generate_data.py --scale 10 --out /tmp/bench_10x
+BASE_EMPLOYEES = 100_000
+HOLIDAYS_PER_YEAR = 20
+DESIGNATIONS = ["Associate", "Engineer", "Senior Engineer", "Lead", "Manager", "Senior Manager", "Director", "VP"]
+ALPHABET = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+
+
+def random_codes(rng, n, length=10):
+    return pd.Series(ALPHABET[rng.integers(0, len(ALPHABET), size=(n, length))].view(f"<U{length}").ravel())
+
+
+def unix(days):
+    # Days since epoch to unix seconds at midnight UTC
+    return days.astype(np.int64) * 86400
+
+
+def write_csv(df, out, day, prefix, name, sep=","):
+    folder = os.path.join(out, f"day{day}", "bronze", prefix, "unprocessed")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    df.to_csv(path, index=False, sep=sep)
+    return os.path.relpath(path, out), len(df)
+
+
+def employees(rng, n):
+    # Unique 10-digit ids like the sample's
+    emp_id = np.unique(rng.integers(1_000_000_000, 10_000_000_000, size=n + n // 10 + 16, dtype=np.int64))
+    emp_id = pd.Series(rng.permutation(emp_id)[:n])
+    age = rng.integers(21, 61, size=n).astype(object)
+    # About 0.5% bad ages and 1% duplicated rows, both dropped by the job
+    bad = rng.random(n) < 0.005
+    age[bad] = rng.choice([None, 0, 130], size=bad.sum())
+    df = pd.DataFrame({"name": random_codes(rng, n), "age": age, "emp_id": emp_id.astype(str)})
+    dupes = df.sample(frac=0.01, random_state=int(rng.integers(1 << 31)))
+    return pd.concat([df, dupes], ignore_index=True), emp_id.to_numpy()
+
+
+def timeframes(rng, emp_ids, reference, history_years=3):
+    """Contiguous designation history per employee, unix start/end dates, plus duplicate rows."""
+    n = len(emp_ids)
+    records = rng.integers(1, 5, size=n)
+    emp = np.repeat(emp_ids, records)
+    first = (reference - timedelta(days=365 * history_years) - date(1970, 1, 1)).days
+    last = (reference - date(1970, 1, 1)).days - 1
+
+    # Sorted random cut points per employee make the records continuous: end = next start
+    starts = rng.integers(first, last, size=len(emp))
+    order = np.lexsort((starts, emp))
+    emp, starts = emp[order], starts[order]
+    same_next = np.r_[emp[1:] == emp[:-1], False]
+    ends = np.where(same_next, np.r_[starts[1:], 0], -1)
+
+    # About 3% of employees have left: their last record gets an end date too
+    left = rng.random(len(emp)) < 0.03
+    ends = np.where((ends == -1) & left, np.minimum(starts + rng.integers(30, 365, size=len(emp)), last), ends)
+
+    df = pd.DataFrame({
+        "emp_id": emp.astype(str),
+        "designation": rng.choice(DESIGNATIONS, size=len(emp)),
+        "start_date": unix(starts),
+        "end_date": pd.array(unix(np.maximum(ends, 0)), dtype="Int64"),
+        "salary": rng.integers(30_000, 300_000, size=len(emp)),
+    })
+    df.loc[ends == -1, "end_date"] = pd.NA
+    # About 2% duplicates on (emp_id, start_date, end_date) with another salary, the job keeps the highest
+    dupes = df.sample(frac=0.02, random_state=int(rng.integers(1 << 31))).copy()
+    dupes["salary"] = dupes["salary"] + rng.integers(-5_000, 5_000, size=len(dupes))
+    return pd.concat([df, dupes], ignore_index=True)
+
+
+def promotions(rng, emp_ids, day):
+    """Next-day increment: about 1% of employees start a new open record, closing their current one."""
+    picked = rng.choice(emp_ids, size=max(1, len(emp_ids) // 100), replace=False)
+    start = unix(np.full(len(picked), (day - date(1970, 1, 1)).days))
+    return pd.DataFrame({
+        "emp_id": picked.astype(str),
+        "designation": rng.choice(DESIGNATIONS, size=len(picked)),
+        "start_date": start,
+        "end_date": pd.array([pd.NA] * len(picked), dtype="Int64"),
+        "salary": rng.integers(30_000, 300_000, size=len(picked)),
+    })
+
+
+def leaves(rng, emp_ids, year, per_employee=6, share=1.0):
+    """Applied leaves for the year with cancellations, re-applications and duplicate applications."""
+    emps = rng.choice(emp_ids, size=int(len(emp_ids) * share), replace=False)
+    counts = rng.poisson(per_employee, size=len(emps))
+    emp = np.repeat(emps, counts)
+    first = (date(year, 1, 1) - date(1970, 1, 1)).days
+    days = first + rng.integers(0, 365, size=len(emp))
+    df = pd.DataFrame({"emp_id": emp, "date": pd.to_datetime(days, unit="D").strftime("%Y-%m-%d"), "status": "ACTIVE"})
+
+    # 10% cancelled, a quarter of those applied again, 5% applied twice
+    cancelled = df.sample(frac=0.10, random_state=int(rng.integers(1 << 31))).assign(status="CANCELLED")
+    reapplied = cancelled.sample(frac=0.25, random_state=int(rng.integers(1 << 31))).assign(status="ACTIVE")
+    duplicated = df.sample(frac=0.05, random_state=int(rng.integers(1 << 31)))
+    return pd.concat([df, cancelled, reapplied, duplicated], ignore_index=True).sample(
+        frac=1.0, random_state=int(rng.integers(1 << 31)))
+
+
+def quotas(rng, emp_ids, years):
+    return pd.DataFrame({
+        "emp_id": np.tile(emp_ids, len(years)),
+        "leave_quota": rng.integers(15, 31, size=len(emp_ids) * len(years)),
+        "year": np.repeat(years, len(emp_ids)),
+    })
+
+
+def holidays(rng, years):
+    rows = []
+    for year in years:
+        days = rng.choice(365, size=HOLIDAYS_PER_YEAR, replace=False)
+        for d in sorted(days):
+            day = date(year, 1, 1) + timedelta(days=int(d))
+            rows.append((random_codes(rng, 1, 6)[0], f"{day.year}-{day.month}-{day.day}"))
+    return pd.DataFrame(rows, columns=["reason", "date"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Glue job inputs at 1x, 10x or 100x")
+    parser.add_argument("--scale", type=int, default=1, help="multiple of the 100k-employee sample")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--reference-date", default=None, help="day 1 of the run, default today (UTC)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    reference = date.fromisoformat(args.reference_date) if args.reference_date else datetime.now(timezone.utc).date()
+    day2 = reference + timedelta(days=1)
+    year = reference.year
+    n = BASE_EMPLOYEES * args.scale
+
+    files = {1: {}, 2: {}}
+    emp_df, emp_ids = employees(rng, n)
+    files[1]["emp_data"] = write_csv(emp_df, args.out, 1, "emp_data", "employee_data.csv")
+    files[1]["emp_time_data"] = write_csv(timeframes(rng, emp_ids, reference), args.out, 1, "emp_time_data", "employee_timeframe_data.csv")
+    files[1]["emp_leave_data"] = write_csv(leaves(rng, emp_ids, year), args.out, 1, "emp_leave_data", "employee_leave_data.csv")
+    files[1]["leave_quota"] = write_csv(quotas(rng, emp_ids, [year, year + 1]), args.out, 1, "leave_quota", "employee_leave_quota_data.csv")
+    files[1]["emp_leave_calender"] = write_csv(holidays(rng, [year, year + 1]), args.out, 1, "emp_leave_calender", "employee_leave_calendar_data.csv")
+
+    # Day 2 is an ordinary daily increment: promotions and a few more leave applications
+    files[2]["emp_time_data"] = write_csv(promotions(rng, emp_ids, day2), args.out, 2, "emp_time_data", "employee_timeframe_data_1.csv")
+    files[2]["emp_leave_data"] = write_csv(leaves(rng, emp_ids, year, per_employee=1, share=0.1), args.out, 2, "emp_leave_data", "employee_leave_data_1.csv")
+
+    manifest = {
+        "scale": args.scale,
+        "employees": n,
+        "seed": args.seed,
+        "days": [
+            {"day": day, "date": (reference + timedelta(days=day - 1)).isoformat(),
+             "files": {dataset: {"path": path, "rows": rows} for dataset, (path, rows) in day_files.items()}}
+            for day, day_files in files.items()
+        ],
+    }
+    with open(os.path.join(args.out, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    for day in manifest["days"]:
+        for dataset, info in day["files"].items():
+            print(f"day{day['day']} {dataset:>18}: {info['rows']:>12,} rows  {info['path']}")
+
+
+if __name__ == "__main__":
+    main()
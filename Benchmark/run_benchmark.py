@@ -0,0 +1,272 @@
+import argparse
+import glob
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import boto3
+import psycopg2
+
+# Runs the Glue job scripts unchanged on local Spark (spark-submit from the AWS Glue
+# local image or any Spark with the awsglue libs) against a local Postgres and S3,
+# day by day over a dataset from generate_data.py, and records per job:
+#   wall time, per-stage duration and shuffle read/write bytes from the Spark event
+#   log, and the JDBC rows each job read and wrote from its [pg_io] report.
+# With --baseline the run fails when a job is slower than the baseline by more than
+# --threshold (and more than --min-regression-seconds, so noise does not fail it).
+#
+#   python run_benchmark.py --data /tmp/bench_1x --pg embedded --s3 embedded --output 1x.json
+#   python run_benchmark.py --data /tmp/bench_1x --pg localhost --s3 http://localhost:9000 \
+#       --baseline 1x.json --threshold 0.2
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+bucket_name = "poc-bootcamp-capstone-group4"
+
+# In DAG order, with the simulated days each job runs on
+JOBS = [
+    ("gp4_emp_leave_calender", "emp_leave_calender", {1}),
+    ("gp4_emp_data_transformation", "emp_data_transformation", {1}),
+    ("gp4_emp_time_data_transformation", "emp_time_data_trans", {1, 2}),
+    ("gp4_emp_leave_quota", "emp_leave_quota", {1}),
+    ("gp4_emp_leave_data", "emp_leave_data", {1, 2}),
+    ("gp4_emp_upcoming_leave_check", "emp_upcoming_leave_check", {1, 2}),
+    ("gp4_daily_active_employee_report", "daily_active_employee_report", {1, 2}),
+    ("gp4_emp_max_availed_leave_check", "emp_max_availed_leave_check", {1}),
+]
+
+pg_io_line = re.compile(r"\[pg_io\] (read|write)\s+(\S+): (\d+) rows")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local end-to-end benchmark of the Glue jobs")
+    parser.add_argument("--data", required=True, help="output directory of generate_data.py")
+    parser.add_argument("--pg", default="localhost", help="Postgres host on port 5432, or 'embedded'")
+    parser.add_argument("--pg-user", default="postgres")
+    parser.add_argument("--pg-pass", default="postgres")
+    parser.add_argument("--s3", default="embedded", help="S3 endpoint URL (MinIO, LocalStack), or 'embedded' for moto")
+    parser.add_argument("--spark-submit", default="spark-submit --master local[*]")
+    parser.add_argument("--packages", default="org.postgresql:postgresql:42.6.0,org.apache.hadoop:hadoop-aws:3.3.4")
+    parser.add_argument("--jobs", default=None, help="comma-separated job names to run, default all")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--min-regression-seconds", type=float, default=5.0)
+    return parser.parse_args()
+
+
+def start_postgres(args):
+    """Connection settings for the jobs. The scripts connect on port 5432 to postgres_capstone."""
+    server = None
+    host = args.pg
+    if args.pg == "embedded":
+        import testing.postgresql
+        server = testing.postgresql.Postgresql(port=5432)
+        host = "127.0.0.1"
+        args.pg_user, args.pg_pass = "postgres", ""
+
+    conn = psycopg2.connect(dbname="postgres", user=args.pg_user, password=args.pg_pass, host=host, port="5432")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DROP DATABASE IF EXISTS postgres_capstone")
+        cur.execute("CREATE DATABASE postgres_capstone")
+    conn.close()
+
+    conn = psycopg2.connect(dbname="postgres_capstone", user=args.pg_user, password=args.pg_pass, host=host, port="5432")
+    with conn, conn.cursor() as cur, open(os.path.join(repo_dir, "Benchmark", "schema.sql")) as file:
+        cur.execute(file.read())
+    conn.close()
+    return server, host
+
+
+def start_s3(args):
+    server = None
+    endpoint = args.s3
+    if args.s3 == "embedded":
+        from moto.server import ThreadedMotoServer
+        server = ThreadedMotoServer(port=5000)
+        server.start()
+        endpoint = "http://127.0.0.1:5000"
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # common/s3_files.py picks the stand-in up from here
+    os.environ["S3_ENDPOINT_URL"] = endpoint
+
+    s3 = boto3.client("s3", endpoint_url=endpoint)
+    s3.create_bucket(Bucket=bucket_name)
+    return server, endpoint, s3
+
+
+def upload_day(s3, data_dir, day):
+    for info in day["files"].values():
+        key = info["path"].split(os.sep, 1)[1].replace(os.sep, "/")
+        s3.upload_file(os.path.join(data_dir, info["path"]), bucket_name, key)
+
+
+def package_scripts(work_dir):
+    """common/ as a zip for --py-files, and the extension-less Glue scripts as .py files."""
+    common_zip = os.path.join(work_dir, "common.zip")
+    with zipfile.ZipFile(common_zip, "w") as archive:
+        for path in glob.glob(os.path.join(repo_dir, "common", "*.py")):
+            archive.write(path, os.path.join("common", os.path.basename(path)))
+    scripts = {}
+    for _, script, _ in JOBS:
+        scripts[script] = os.path.join(work_dir, f"{script}.py")
+        shutil.copy(os.path.join(repo_dir, "Glue Jobs", script), scripts[script])
+    return common_zip, scripts
+
+
+def job_args(args, pg_host, run_date):
+    year = run_date[:4]
+    return {
+        "db_user": args.pg_user,
+        "db_pass": args.pg_pass,
+        "db_host": pg_host,
+        "pg_url": f"jdbc:postgresql://{pg_host}:5432/postgres_capstone",
+        "curr_ts": f"{run_date} 07:00:00",
+        "start_date": run_date,
+        "end_of_year": f"{year}-12-31",
+        "start_of_year": f"{year}-01-01",
+        "today": run_date,
+        "CURRENT_YEAR": year,
+    }
+
+
+def stage_metrics(event_dir):
+    """Per-stage duration, shuffle bytes and input records from the Spark event log."""
+    stages = []
+    for path in glob.glob(os.path.join(event_dir, "*")):
+        with open(path) as file:
+            for line in file:
+                event = json.loads(line)
+                if event.get("Event") != "SparkListenerStageCompleted":
+                    continue
+                info = event["Stage Info"]
+                acc = {a["Name"]: a.get("Value") for a in info.get("Accumulables", []) if "Name" in a}
+
+                def metric(name):
+                    return int(acc.get(f"internal.metrics.{name}", 0) or 0)
+
+                stages.append({
+                    "stage_id": info["Stage ID"],
+                    "name": info["Stage Name"],
+                    "seconds": (info.get("Completion Time", 0) - info.get("Submission Time", 0)) / 1000,
+                    "shuffle_read_bytes": metric("shuffle.read.remoteBytesRead") + metric("shuffle.read.localBytesRead"),
+                    "shuffle_write_bytes": metric("shuffle.write.bytesWritten"),
+                    "input_records": metric("input.recordsRead"),
+                    "spill_bytes": metric("diskBytesSpilled"),
+                })
+    return sorted(stages, key=lambda stage: stage["stage_id"])
+
+
+def run_job(args, name, script, common_zip, s3_endpoint, glue_args, work_dir, day):
+    event_dir = os.path.join(work_dir, "events", f"{name}_day{day}")
+    os.makedirs(event_dir, exist_ok=True)
+    confs = {
+        "spark.eventLog.enabled": "true",
+        "spark.eventLog.dir": f"file://{event_dir}",
+        "spark.eventLog.compress": "false",
+        # The scripts use s3:// paths, served here by S3A against the stand-in
+        "spark.hadoop.fs.s3.impl": "org.apache.hadoop.fs.s3a.S3AFileSystem",
+        "spark.hadoop.fs.s3a.endpoint": s3_endpoint,
+        "spark.hadoop.fs.s3a.path.style.access": "true",
+        "spark.hadoop.fs.s3a.access.key": os.environ["AWS_ACCESS_KEY_ID"],
+        "spark.hadoop.fs.s3a.secret.key": os.environ["AWS_SECRET_ACCESS_KEY"],
+    }
+    command = shlex.split(args.spark_submit) + ["--packages", args.packages, "--py-files", common_zip]
+    for key, value in confs.items():
+        command += ["--conf", f"{key}={value}"]
+    command += [script, "--JOB_NAME", name]
+    for key, value in glue_args.items():
+        command += [f"--{key}", value]
+
+    start = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    with open(os.path.join(work_dir, f"{name}_day{day}.log"), "w") as file:
+        file.write(process.stdout)
+        file.write(process.stderr)
+
+    jdbc = {"read": {}, "write": {}}
+    for kind, table, rows in pg_io_line.findall(process.stdout):
+        jdbc[kind][table] = jdbc[kind].get(table, 0) + int(rows)
+
+    stages = stage_metrics(event_dir)
+    return {
+        "exit_code": process.returncode,
+        "wall_seconds": wall,
+        "shuffle_read_bytes": sum(stage["shuffle_read_bytes"] for stage in stages),
+        "shuffle_write_bytes": sum(stage["shuffle_write_bytes"] for stage in stages),
+        "jdbc_rows": jdbc,
+        "stages": stages,
+    }
+
+
+def compare(results, baseline, threshold, min_seconds):
+    regressions = []
+    for key, run in results["runs"].items():
+        before = baseline["runs"].get(key)
+        if before is None or before["exit_code"] != 0:
+            continue
+        slower = run["wall_seconds"] - before["wall_seconds"]
+        if run["wall_seconds"] > before["wall_seconds"] * (1 + threshold) and slower > min_seconds:
+            regressions.append(f"{key}: {before['wall_seconds']:.1f}s -> {run['wall_seconds']:.1f}s (+{slower:.1f}s)")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    with open(os.path.join(args.data, "manifest.json")) as file:
+        manifest = json.load(file)
+    selected = set(args.jobs.split(",")) if args.jobs else None
+
+    work_dir = tempfile.mkdtemp(prefix="glue_bench_")
+    pg_server, pg_host = start_postgres(args)
+    s3_server, s3_endpoint, s3 = start_s3(args)
+    common_zip, scripts = package_scripts(work_dir)
+
+    results = {"scale": manifest["scale"], "employees": manifest["employees"], "runs": {}}
+    try:
+        for day in manifest["days"]:
+            upload_day(s3, args.data, day)
+            glue_args = job_args(args, pg_host, day["date"])
+            for name, script, days in JOBS:
+                if day["day"] not in days or (selected and name not in selected):
+                    continue
+                run = run_job(args, name, scripts[script], common_zip, s3_endpoint, glue_args, work_dir, day["day"])
+                results["runs"][f"{name}@day{day['day']}"] = run
+                status = "ok" if run["exit_code"] == 0 else f"FAILED ({run['exit_code']})"
+                print(f"day{day['day']} {name:<36} {run['wall_seconds']:8.1f}s  "
+                      f"shuffle r/w {run['shuffle_read_bytes'] / 1e6:8.1f}/{run['shuffle_write_bytes'] / 1e6:8.1f} MB  "
+                      f"jdbc r/w {sum(run['jdbc_rows']['read'].values()):>10}/{sum(run['jdbc_rows']['write'].values()):>10}  {status}")
+    finally:
+        if s3_server:
+            s3_server.stop()
+        if pg_server:
+            pg_server.stop()
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results in {args.output}, logs and event logs in {work_dir}")
+
+    failed = [key for key, run in results["runs"].items() if run["exit_code"] != 0]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_regression_seconds)
+    for line in regressions:
+        print("REGRESSION", line)
+    for key in failed:
+        print("FAILED", key)
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
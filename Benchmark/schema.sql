@@ -0,0 +1,36 @@
+-- Base tables the Glue jobs expect to exist in a fresh postgres_capstone.
+-- Everything else (stages, calendar, ledgers, reports) is created by the jobs.
+CREATE TABLE IF NOT EXISTS emp_data_trans (
+    name text,
+    age integer,
+    emp_id text
+);
+
+CREATE TABLE IF NOT EXISTS emp_time_data (
+    emp_id text,
+    designation text,
+    start_date date,
+    end_date date,
+    salary integer,
+    status text
+);
+
+CREATE TABLE IF NOT EXISTS emp_leave_data (
+    emp_id bigint,
+    date text,
+    status text,
+    ingest_date text,
+    ingest_timestamp timestamp
+);
+
+CREATE TABLE IF NOT EXISTS emp_leave_quota (
+    emp_id bigint,
+    leave_quota integer,
+    year integer
+);
+
+CREATE TABLE IF NOT EXISTS emp_leave_calendar (
+    reason text,
+    date date,
+    leave_year integer
+);
@@ -0,0 +1,74 @@
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import *
+
+from flagging import ReservedWordMatcher, make_flag_udf
+
+# Compares the old rlike alternation against the vectorized matcher on local Spark.
+# Usage: python benchmark_flagging.py [data_dir] [sizes...]
+data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dataset")
+sizes = [int(n) for n in sys.argv[2:]] or [10_000, 100_000, 1_000_000]
+words_per_message = 8
+flagged_ratio = 0.1
+
+with open(os.path.join(data_dir, "vocab.json"), "r") as file:
+    vocab = json.load(file)
+with open(os.path.join(data_dir, "marked_word.json"), "r") as file:
+    reserved_words = json.load(file)
+
+reserved_set = set(reserved_words)
+clean_vocab = [word for word in vocab if word not in reserved_set]
+
+spark = SparkSession.builder \
+    .appName("FlaggingBenchmark") \
+    .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+    .getOrCreate()
+
+spark.sparkContext.setLogLevel("ERROR")
+spark.sparkContext.addPyFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "flagging.py"))
+
+# Old path: one big case-insensitive alternation
+pattern = "|".join([word.lower() for word in reserved_words])
+
+# New path: matcher built once, applied per Arrow batch
+flag_messages = make_flag_udf(ReservedWordMatcher(reserved_words))
+
+
+def make_messages(n, seed=42):
+    rnd = random.Random(seed)
+    messages = []
+    for _ in range(n):
+        words = rnd.choices(clean_vocab, k=words_per_message)
+        if rnd.random() < flagged_ratio:
+            words[rnd.randrange(words_per_message)] = rnd.choice(reserved_words)
+        messages.append(" ".join(words))
+    return pd.DataFrame({"message": messages})
+
+
+def run(df, flag_col):
+    start = time.perf_counter()
+    flagged = df.select(flag_col.alias("flag")).agg(sum(col("flag").cast("int"))).collect()[0][0]
+    return time.perf_counter() - start, flagged
+
+
+print(f"{'messages':>10} {'rlike_s':>10} {'matcher_s':>10} {'speedup':>8} {'flagged':>8}")
+for n in sizes:
+    df = spark.createDataFrame(make_messages(n)).cache()
+    df.count()
+
+    rlike_s, rlike_flagged = run(df, lower(col("message")).rlike(pattern))
+    matcher_s, matcher_flagged = run(df, flag_messages(col("message")).getField("flag"))
+
+    if rlike_flagged != matcher_flagged:
+        print(f"Mismatch at {n} messages: rlike={rlike_flagged} matcher={matcher_flagged}")
+
+    print(f"{n:>10} {rlike_s:>10.2f} {matcher_s:>10.2f} {rlike_s / matcher_s:>7.1f}x {matcher_flagged:>8}")
+    df.unpersist()
+
+spark.stop()
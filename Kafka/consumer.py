@@ -1,25 +1,42 @@
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import *
 from pyspark.sql.types import *
-import json
-
-# Load reserved words from JSON file
-with open("/home/naman/Downloads/capstone/bootcamp-project/data/marked_word.json", "r") as file:
-    reserved_words = json.load(file)
-
-# Create regex pattern from reserved words (case insensitive)
-pattern = "|".join([word.lower() for word in reserved_words])
+import os
+import sys
+import psycopg2
+from flag_counters import ensure_counters, start_counter_query
+from flagging import ReservedWordMatcher, make_flag_udf
+from pg_sink import ensure_message_key, insert_new_messages, write_partition
+from strike_engine import start_strike_query
+from strike_ledger import ensure_strike_ledger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.active_index import ActiveIndexWatcher
+
+# Build the reserved word matcher once from the JSON file
+matcher = ReservedWordMatcher.from_json("/home/naman/Downloads/capstone/bootcamp-project/data/marked_word.json")
+flag_messages = make_flag_udf(matcher)
 
 # Create Spark session
 spark = SparkSession.builder \
     .appName("KafkaToPostgresBatch10") \
     .config("spark.jars.packages",
-            "org.apache.spark:spark-sql-kafka-0-10_2.12:3.3.2,"
+            "org.apache.spark:spark-sql-kafka-0-10_2.12:3.4.1,"
             "org.postgresql:postgresql:42.6.0") \
+    .config("spark.sql.streaming.stateStore.providerClass",
+            "org.apache.spark.sql.execution.streaming.state.RocksDBStateStoreProvider") \
     .getOrCreate()
 
 spark.sparkContext.setLogLevel("ERROR")
 
+# Executors need the matcher and sink modules
+kafka_dir = os.path.dirname(os.path.abspath(__file__))
+spark.sparkContext.addPyFile(os.path.join(kafka_dir, "flagging.py"))
+spark.sparkContext.addPyFile(os.path.join(kafka_dir, "pg_sink.py"))
+spark.sparkContext.addPyFile(os.path.join(kafka_dir, "strike_ledger.py"))
+spark.sparkContext.addPyFile(os.path.join(kafka_dir, "strike_engine.py"))
+spark.sparkContext.addPyFile(os.path.join(kafka_dir, "flag_counters.py"))
+
 # Define schema for incoming Kafka messages with flag column
 schema = StructType() \
     .add("sender", StringType()) \
@@ -43,41 +60,123 @@ df_parsed = df_raw.selectExpr("CAST(value AS STRING) as json") \
     .select("data.*") \
     .na.drop(subset=["sender", "receiver", "message", "timestamp"])
 
-# Add the flag column based on reserved words (case-insensitive)
-df_flagged = df_parsed.withColumn(
-    "flag",
-    when(lower(col("message")).rlike(pattern), True).otherwise(False)
-)
-
-# Write to PostgreSQL in batches of 10 records
-def write_to_postgres(batch_df, batch_id):
-    if batch_df.count() == 0:
-        print(f"Skipping batch {batch_id} (empty batch).")
+# Add the flag column based on reserved words (case-insensitive), flagged per Arrow batch
+df_flagged = df_parsed.withColumn("flags", flag_messages(col("message"))) \
+    .select(
+        "sender",
+        "receiver",
+        "message",
+        "timestamp",
+        col("flags.flag").alias("flag"),
+        col("flags.matched_words").alias("matched_words")
+    )
+
+# Sink settings: "copy" streams each partition through COPY, "insert" uses multi-row INSERTs,
+# "jdbc" is a single Spark JDBC write with batched inserts
+SINK_MODE = os.environ.get("SINK_MODE", "copy")
+SINK_CHUNK_SIZE = int(os.environ.get("SINK_CHUNK_SIZE", "5000"))
+SINK_PARALLELISM = int(os.environ.get("SINK_PARALLELISM", "4"))
+SINK_POOL_SIZE = int(os.environ.get("SINK_POOL_SIZE", "2"))
+
+# "stream" adds strike events to the ledger from this job, "batch" leaves them to final_code2.py
+STRIKE_ENGINE = os.environ.get("STRIKE_ENGINE", "batch")
+
+# "on" keeps the per-employee flagged sent/received counters live, "off" skips that query
+FLAG_COUNTERS = os.environ.get("FLAG_COUNTERS", "on")
+
+# "on" writes messages whose sender or receiver is not an active employee to
+# kafka_messages_rejected instead of kafka_messages, "off" writes every message
+EMPLOYEE_CHECK = os.environ.get("EMPLOYEE_CHECK", "on")
+# How often the stream looks for a newer active-employee index
+EMPLOYEE_INDEX_POLL_SECONDS = int(os.environ.get("EMPLOYEE_INDEX_POLL_SECONDS", "30"))
+
+pg_conn_params = {
+    "host": "localhost",
+    "port": "5432",
+    "dbname": "postgres_capstone",
+    "user": "postgres",
+    "password": "postgres"
+}
+kafka_message_columns = ["sender", "receiver", "message", "timestamp", "flag"]
+
+# The index is published by the daily emp_time_data job and rebuilt whenever
+# strikes close records, the stream picks up each new version between batches
+active_index_watcher = ActiveIndexWatcher(lambda: psycopg2.connect(**pg_conn_params), EMPLOYEE_INDEX_POLL_SECONDS)
+
+# Both sink tables refuse messages they already hold, so a replayed micro-batch is written once
+sink_conn = psycopg2.connect(**pg_conn_params)
+ensure_message_key(sink_conn, "kafka_messages")
+if EMPLOYEE_CHECK == "on":
+    with sink_conn.cursor() as cur:
+        cur.execute("CREATE TABLE IF NOT EXISTS kafka_messages_rejected (LIKE kafka_messages)")
+    sink_conn.commit()
+    ensure_message_key(sink_conn, "kafka_messages_rejected")
+sink_conn.close()
+
+
+# Write one micro-batch's messages to `table`
+def write_messages(batch_df, batch_id, table):
+    # Cap the number of concurrent connections into Postgres
+    if batch_df.rdd.getNumPartitions() > SINK_PARALLELISM:
+        batch_df = batch_df.coalesce(SINK_PARALLELISM)
+
+    if SINK_MODE == "jdbc":
+        # Spark JDBC cannot skip conflicts, so the batch lands in a stage and moves over from there
+        stage_table = f"{table}_batch_stage"
+        batch_df.write \
+            .format("jdbc") \
+            .option("url", "jdbc:postgresql://localhost:5432/postgres_capstone?reWriteBatchedInserts=true") \
+            .option("dbtable", stage_table) \
+            .option("user", "postgres") \
+            .option("password", "postgres") \
+            .option("driver", "org.postgresql.Driver") \
+            .option("batchsize", SINK_CHUNK_SIZE) \
+            .option("numPartitions", SINK_PARALLELISM) \
+            .option("truncate", "true") \
+            .mode("overwrite") \
+            .save()
+        conn = psycopg2.connect(**pg_conn_params)
+        try:
+            with conn.cursor() as cur:
+                written = insert_new_messages(cur, table, stage_table, kafka_message_columns)
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Processed batch {batch_id} with {written} new records into {table}")
         return
 
-    print(f"Processing batch {batch_id} with {batch_df.count()} records")
+    # Each partition reports its own row count, so the batch is counted by the write itself
+    mode, chunk_size, pool_size = SINK_MODE, SINK_CHUNK_SIZE, SINK_POOL_SIZE
+    written = batch_df.rdd.mapPartitions(
+        lambda rows: [write_partition(rows, pg_conn_params, table, kafka_message_columns,
+                                      mode=mode, chunk_size=chunk_size, max_connections=pool_size)]
+    ).sum()
 
-    batch_size = 10
-    total_rows = batch_df.count()
+    if written == 0:
+        print(f"Skipping batch {batch_id} (empty batch).")
+    else:
+        print(f"Processed batch {batch_id} with {written} records into {table}")
 
-    # Use monotonically_increasing_id to simulate row numbers
-    batch_df = batch_df.withColumn("row_id", monotonically_increasing_id())
 
-    for start in range(0, total_rows, batch_size):
-        end = start + batch_size
-        chunk_df = batch_df.filter((col("row_id") >= start) & (col("row_id") < end)).drop("row_id")
+# Write each micro-batch to PostgreSQL, messages between active employees to kafka_messages
+def write_to_postgres(batch_df, batch_id):
+    # matched_words is for downstream consumers only, kafka_messages keeps its columns
+    batch_df = batch_df.select(*kafka_message_columns)
 
-        # print(f"Writing records {start + 1} to {min(end, total_rows)}")
+    index = active_index_watcher.current() if EMPLOYEE_CHECK == "on" else None
+    if index is None:
+        write_messages(batch_df, batch_id, "kafka_messages")
+        return
 
-        chunk_df.write \
-            .format("jdbc") \
-            .option("url", "jdbc:postgresql://localhost:5432/postgres_capstone") \
-            .option("dbtable", "kafka_messages") \
-            .option("user", "postgres") \
-            .option("password", "postgres") \
-            .option("driver", "org.postgresql.Driver") \
-            .mode("append") \
-            .save()
+    # Sender and receiver looked up in the broadcast index, in memory on the executors
+    checked_df = index.flag_active(spark, batch_df, "sender", "sender_active")
+    checked_df = index.flag_active(spark, checked_df, "receiver", "receiver_active").cache()
+    try:
+        valid = col("sender_active") & col("receiver_active")
+        write_messages(checked_df.filter(valid).select(*kafka_message_columns), batch_id, "kafka_messages")
+        write_messages(checked_df.filter(~valid).select(*kafka_message_columns), batch_id, "kafka_messages_rejected")
+    finally:
+        checked_df.unpersist()
 
 
 # Start the streaming job and apply foreachBatch
@@ -88,4 +187,26 @@ query = df_flagged.writeStream \
     .trigger(processingTime='10 seconds') \
     .start()
 
-query.awaitTermination()
+# Strike events into the ledger as flagged messages arrive, deduplicated in keyed state per sender
+if STRIKE_ENGINE == "stream":
+    ledger_conn = psycopg2.connect(**pg_conn_params)
+    ensure_strike_ledger(ledger_conn)
+    ledger_conn.close()
+    strike_query = start_strike_query(
+        df_flagged,
+        pg_conn_params,
+        "/home/naman/Downloads/capstone/bootcamp-project/kafka/strike_state_checkpoint/"
+    )
+
+# Flagged messages sent and received per employee, in total and per month
+if FLAG_COUNTERS == "on":
+    counters_conn = psycopg2.connect(**pg_conn_params)
+    ensure_counters(counters_conn)
+    counters_conn.close()
+    counter_query = start_counter_query(
+        df_flagged,
+        pg_conn_params,
+        "/home/naman/Downloads/capstone/bootcamp-project/kafka/counter_checkpoint/"
+    )
+
+spark.streams.awaitAnyTermination()
@@ -0,0 +1,175 @@
+import pandas as pd
+from pyspark.sql.functions import *
+from pyspark.sql.streaming.state import GroupStateTimeout
+
+from pg_sink import get_pool
+from psycopg2.extras import execute_values
+
+# Running counts of flagged messages each employee sent and received, in total
+# and per calendar month (UTC, by Kafka timestamp). Lookups are primary key reads:
+#   SELECT sent, received FROM flag_counters WHERE emp_id = ...
+#   SELECT month, sent, received FROM flag_counters_monthly WHERE emp_id = ... ORDER BY month
+counters_ddl = [
+    """
+    CREATE TABLE IF NOT EXISTS flag_counters (
+        emp_id bigint PRIMARY KEY,
+        sent bigint NOT NULL DEFAULT 0,
+        received bigint NOT NULL DEFAULT 0,
+        updated_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flag_counters_monthly (
+        emp_id bigint NOT NULL,
+        month date NOT NULL,
+        sent bigint NOT NULL DEFAULT 0,
+        received bigint NOT NULL DEFAULT 0,
+        updated_at timestamp NOT NULL DEFAULT now(),
+        PRIMARY KEY (emp_id, month)
+    )
+    """,
+]
+
+counter_state_schema = "total_sent LONG, total_received LONG, months ARRAY<STRING>, month_sent ARRAY<LONG>, month_received ARRAY<LONG>"
+counter_output_schema = "emp_id LONG, month STRING, sent LONG, received LONG"
+
+# The stream emits absolute counts, so replaying a micro-batch writes the same values again
+upsert_totals_sql = """
+INSERT INTO flag_counters (emp_id, sent, received) VALUES %s
+ON CONFLICT (emp_id) DO UPDATE SET sent = EXCLUDED.sent, received = EXCLUDED.received, updated_at = now()
+"""
+
+upsert_monthly_sql = """
+INSERT INTO flag_counters_monthly (emp_id, month, sent, received) VALUES %s
+ON CONFLICT (emp_id, month) DO UPDATE SET sent = EXCLUDED.sent, received = EXCLUDED.received, updated_at = now()
+"""
+
+
+def ensure_counters(conn):
+    cur = conn.cursor()
+    try:
+        for ddl in counters_ddl:
+            cur.execute(ddl)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def update_counters(key, batches, state):
+    """Keyed state per employee: all-time totals plus the counts of the months still open.
+
+    A month stays in state until the watermark passes into a later month, so
+    late messages inside the watermark still land in the right month. Rows
+    behind the watermark are ignored. One row per touched month and one total
+    row (month None) go out per micro-batch, with absolute counts.
+    """
+    emp_id = key[0]
+    if state.exists:
+        total_sent, total_received, months, month_sent, month_received = state.get
+        counts = {m: [s, r] for m, s, r in zip(months, month_sent, month_received)}
+    else:
+        total_sent, total_received, counts = 0, 0, {}
+
+    watermark = state.getCurrentWatermarkMs() // 1000
+    touched = set()
+    for pdf in batches:
+        pdf = pdf[pdf["event_ts"] >= watermark]
+        if pdf.empty:
+            continue
+        pdf = pdf.assign(month=pd.to_datetime(pdf["event_ts"], unit="s").dt.strftime("%Y-%m-01"))
+        for month, group in pdf.groupby("month"):
+            sent, received = int(group["sent"].sum()), int(group["received"].sum())
+            current = counts.setdefault(month, [0, 0])
+            current[0] += sent
+            current[1] += received
+            total_sent += sent
+            total_received += received
+            touched.add(month)
+
+    if watermark:
+        # Months before the watermark's month can no longer change
+        open_from = pd.Timestamp(watermark, unit="s").strftime("%Y-%m-01")
+        counts = {m: c for m, c in counts.items() if m >= open_from}
+
+    months = sorted(counts)
+    state.update((total_sent, total_received, months,
+                  [counts[m][0] for m in months], [counts[m][1] for m in months]))
+    if not touched:
+        return
+
+    touched = sorted(m for m in touched if m in counts)
+    yield pd.DataFrame({
+        "emp_id": [emp_id] * (len(touched) + 1),
+        "month": [None] + touched,
+        "sent": [total_sent] + [counts[m][0] for m in touched],
+        "received": [total_received] + [counts[m][1] for m in touched],
+    })
+
+
+def apply_counter_updates(rows, conn_params):
+    totals, monthly = [], []
+    for row in rows:
+        if row.month is None:
+            totals.append((row.emp_id, row.sent, row.received))
+        else:
+            monthly.append((row.emp_id, row.month, row.sent, row.received))
+    if not totals and not monthly:
+        return
+    conn_pool = get_pool(conn_params, 2)
+    conn = conn_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            if totals:
+                execute_values(cur, upsert_totals_sql, sorted(totals))
+            if monthly:
+                execute_values(cur, upsert_monthly_sql, sorted(monthly), template="(%s, %s::date, %s, %s)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn_pool.putconn(conn)
+
+
+def start_counter_query(df_flagged, conn_params, checkpoint_location, watermark="10 minutes"):
+    """Start the streaming query that keeps flag_counters and flag_counters_monthly up to date."""
+    # Every flagged message counts once for its sender and once for its receiver
+    flag_events = df_flagged.filter(col("flag")) \
+        .select(
+            explode(array(
+                struct(col("sender").alias("emp_id"), lit(1).alias("sent"), lit(0).alias("received")),
+                struct(col("receiver").alias("emp_id"), lit(0).alias("sent"), lit(1).alias("received"))
+            )).alias("e"),
+            col("timestamp")
+        ) \
+        .select(
+            col("e.emp_id").cast("long").alias("emp_id"),
+            col("e.sent").alias("sent"),
+            col("e.received").alias("received"),
+            col("timestamp").alias("event_ts"),
+            timestamp_seconds(col("timestamp")).alias("event_time")
+        ) \
+        .filter(col("emp_id").isNotNull()) \
+        .withWatermark("event_time", watermark)
+
+    counter_updates = flag_events.groupBy("emp_id").applyInPandasWithState(
+        update_counters,
+        outputStructType=counter_output_schema,
+        stateStructType=counter_state_schema,
+        outputMode="update",
+        timeoutConf=GroupStateTimeout.NoTimeout
+    )
+
+    def write_counters(batch_df, batch_id):
+        # All rows of an employee in one partition, so no two writers touch the same rows
+        batch_df.repartition("emp_id").foreachPartition(lambda rows: apply_counter_updates(rows, conn_params))
+
+    return counter_updates.writeStream \
+        .outputMode("update") \
+        .foreachBatch(write_counters) \
+        .option("checkpointLocation", checkpoint_location) \
+        .trigger(processingTime='10 seconds') \
+        .start()
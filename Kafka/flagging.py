@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+from pyspark.sql.functions import pandas_udf
+from pyspark.sql.types import ArrayType, BooleanType, StringType, StructField, StructType
+
+# Result of flagging one message: the flag itself plus the reserved words that triggered it
+flag_schema = StructType([
+    StructField("flag", BooleanType(), True),
+    StructField("matched_words", ArrayType(StringType()), True)
+])
+
+
+class ReservedWordMatcher:
+    """Multi-keyword matcher built once from marked_word.json.
+
+    Gives the same answer as the old `rlike("w1|w2|...")` check (substring,
+    case-insensitive) but looks every window of the message up in a hash set
+    instead of trying every alternation branch at every character.
+    """
+
+    def __init__(self, reserved_words):
+        self.words_by_len = {}
+        for word in reserved_words:
+            word = word.lower()
+            if word:
+                self.words_by_len.setdefault(len(word), set()).add(word)
+        # One sliding-window pass per distinct word length (marked_word.json has a single length)
+        self.lengths = sorted(self.words_by_len)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r") as file:
+            return cls(json.load(file))
+
+    def match(self, message):
+        if not message:
+            return []
+        message = message.lower()
+        matched = set()
+        for length in self.lengths:
+            words = self.words_by_len[length]
+            windows = {message[i:i + length] for i in range(len(message) - length + 1)}
+            matched.update(words.intersection(windows))
+        return sorted(matched)
+
+    def flag_batch(self, messages):
+        matched = [self.match(message) for message in messages]
+        return pd.DataFrame({
+            "flag": [len(words) > 0 for words in matched],
+            "matched_words": matched
+        })
+
+
+def make_flag_udf(matcher):
+    # Vectorized UDF: Spark hands over whole Arrow batches of messages, not one row at a time
+    @pandas_udf(flag_schema)
+    def flag_messages(messages: pd.Series) -> pd.DataFrame:
+        return matcher.flag_batch(messages)
+
+    return flag_messages
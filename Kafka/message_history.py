@@ -0,0 +1,220 @@
+import os
+import re
+from datetime import date, datetime, timezone
+
+# kafka_messages_history is range partitioned by month of the message timestamp.
+# Queries on a time window only touch the partitions of that window, flagged
+# messages have their own partial index and the whole table a BRIN on timestamp.
+# Months older than HISTORY_RETENTION_MONTHS are moved to Parquet under
+# HISTORY_ARCHIVE_PATH (month=YYYY-MM-01/part_oid=<oid>) and dropped from Postgres.
+HISTORY_TABLE = "kafka_messages_history"
+DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+# Rows of the old unpartitioned table without a timestamp, which no partition can take
+QUARANTINE_TABLE = f"{HISTORY_TABLE}_quarantine"
+HISTORY_RETENTION_MONTHS = int(os.environ.get("HISTORY_RETENTION_MONTHS", "6"))
+HISTORY_ARCHIVE_PATH = os.environ.get(
+    "HISTORY_ARCHIVE_PATH", "file:///home/naman/Downloads/capstone/bootcamp-project/kafka/history_archive")
+HISTORY_ARCHIVE_COMPRESSION = os.environ.get("HISTORY_ARCHIVE_COMPRESSION", "zstd")
+
+partition_name = re.compile(rf"^{HISTORY_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+history_ddl = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+        sender text,
+        receiver text,
+        message text,
+        timestamp timestamp NOT NULL,
+        flag boolean
+    ) PARTITION BY RANGE (timestamp)
+    """,
+    # Catches rows of months that have no partition yet, they move out once it is created
+    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {HISTORY_TABLE} DEFAULT",
+    f"CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_flagged_idx ON {HISTORY_TABLE} (timestamp, sender) WHERE flag",
+    f"CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_ts_brin ON {HISTORY_TABLE} USING brin (timestamp)",
+]
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_for(month):
+    return f"{HISTORY_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def ensure_month_partition(cur, month):
+    """Create the partition of `month`, moving in any of its rows parked in the default partition."""
+    name = partition_for(month)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+    lo, hi = month, add_months(month, 1)
+    cur.execute(f"CREATE TABLE {name} (LIKE {HISTORY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= %(lo)s AND timestamp < %(hi)s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, {"lo": lo, "hi": hi})
+    cur.execute(f"ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lo, hi))
+    return True
+
+
+def ensure_history(conn):
+    """Create the partitioned history, moving an old unpartitioned kafka_messages_history into it once."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (HISTORY_TABLE,))
+        row = cur.fetchone()
+        legacy = row is not None and row[0] == 'r'
+        if legacy:
+            cur.execute(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {HISTORY_TABLE}_legacy")
+        for ddl in history_ddl:
+            cur.execute(ddl)
+        if legacy:
+            cur.execute(f"SELECT min(timestamp), max(timestamp) FROM {HISTORY_TABLE}_legacy")
+            lo, hi = cur.fetchone()
+            if lo is not None:
+                month = month_start(lo)
+                while month <= month_start(hi):
+                    ensure_month_partition(cur, month)
+                    month = add_months(month, 1)
+            cur.execute(f"""
+                INSERT INTO {HISTORY_TABLE} (sender, receiver, message, timestamp, flag)
+                SELECT sender::text, receiver::text, message, timestamp, flag
+                FROM {HISTORY_TABLE}_legacy WHERE timestamp IS NOT NULL
+            """)
+            moved = cur.rowcount
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {QUARANTINE_TABLE} (
+                    sender text, receiver text, message text, timestamp timestamp, flag boolean
+                )
+            """)
+            cur.execute(f"""
+                INSERT INTO {QUARANTINE_TABLE} (sender, receiver, message, timestamp, flag)
+                SELECT sender::text, receiver::text, message, timestamp, flag
+                FROM {HISTORY_TABLE}_legacy WHERE timestamp IS NULL
+            """)
+            quarantined = cur.rowcount
+            # The old table only goes once every one of its rows has been copied
+            cur.execute(f"SELECT count(*) FROM {HISTORY_TABLE}_legacy")
+            legacy_rows = cur.fetchone()[0]
+            if moved + quarantined != legacy_rows:
+                raise RuntimeError(f"{HISTORY_TABLE}: {moved} rows moved and {quarantined} quarantined "
+                                   f"out of {legacy_rows}, old table kept")
+            print(f"{HISTORY_TABLE} partitioned, {moved} rows moved from the old table, "
+                  f"{quarantined} without a timestamp kept in {QUARANTINE_TABLE}")
+            cur.execute(f"DROP TABLE {HISTORY_TABLE}_legacy")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def prepare_history_partitions(conn):
+    """Partitions for every month the waiting kafka_messages fall in, plus the current and next month."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT min(timestamp), max(timestamp) FROM kafka_messages")
+        lo, hi = cur.fetchone()
+        today = month_start(datetime.now(timezone.utc))
+        first, last = today, add_months(today, 1)
+        if lo is not None:
+            # One month of slack either side for the Spark session time zone
+            first = min(first, add_months(month_start(datetime.fromtimestamp(int(lo), tz=timezone.utc)), -1))
+            last = max(last, add_months(month_start(datetime.fromtimestamp(int(hi), tz=timezone.utc)), 1))
+        created = 0
+        month = first
+        while month <= last:
+            created += ensure_month_partition(cur, month)
+            month = add_months(month, 1)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return created
+
+
+def expired_partitions(conn, retention_months):
+    """(month, name, oid) of the attached monthly partitions older than the retention window."""
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, c.oid FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, (HISTORY_TABLE,))
+        rows = cur.fetchall()
+    expired = []
+    for name, oid in rows:
+        match = partition_name.match(name)
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            if month < cutoff:
+                expired.append((month, name, oid))
+    return sorted(expired)
+
+
+def archive_history(spark, io, conn, retention_months=HISTORY_RETENTION_MONTHS, archive_path=HISTORY_ARCHIVE_PATH):
+    """Move every month past the retention window to compressed Parquet, then drop its partition.
+
+    A partition is only dropped once the Parquet copy holds all of its rows. The
+    copy is keyed by the partition's oid, so a rerun after a failure overwrites
+    its own earlier attempt, and late messages of an archived month that got a
+    new partition land next to the first copy instead of replacing it.
+    """
+    archived = 0
+    for month, name, oid in expired_partitions(conn, retention_months):
+        target = f"{archive_path}/month={month.isoformat()}/part_oid={oid}"
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {name}")
+            rows = cur.fetchone()[0]
+        conn.rollback()
+
+        io.read(name).write.mode("overwrite") \
+            .option("compression", HISTORY_ARCHIVE_COMPRESSION).parquet(target)
+        copied = spark.read.parquet(target).count()
+        if copied != rows:
+            print(f"{name}: archive has {copied} of {rows} rows, partition kept")
+            continue
+
+        cur = conn.cursor()
+        try:
+            cur.execute(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        archived += rows
+        print(f"{name}: {rows} rows archived to {target}")
+    return archived
+
+
+def audit_history(spark, io, start, end, archive_path=HISTORY_ARCHIVE_PATH):
+    """Messages with start <= timestamp < end from Postgres and the Parquet archive together."""
+    live = io.read_query(
+        f"SELECT * FROM {HISTORY_TABLE} WHERE timestamp >= '{start.isoformat()}' AND timestamp < '{end.isoformat()}'",
+        "history_window"
+    )
+    try:
+        archived = spark.read.parquet(archive_path)
+    except Exception:
+        # Nothing archived yet
+        return live
+    archived = archived.filter(
+        (archived["month"] >= month_start(start)) & (archived["month"] < end) &
+        (archived["timestamp"] >= start) & (archived["timestamp"] < end)
+    ).drop("month", "part_oid")
+    return live.unionByName(archived)
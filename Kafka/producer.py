@@ -1,23 +1,258 @@
+import argparse
+import csv
 import json
+import os
+import random
+import threading
 import time
-from kafka import KafkaProducer
-
-# Load messages from messages.json
-with open("/home/naman/Downloads/capstone/bootcamp-project/data/messages.json", "r") as file:
-    messages = json.load(file)
-
-# Set up Kafka producer
-producer = KafkaProducer(
-    bootstrap_servers='localhost:9092',
-    value_serializer=lambda v: json.dumps(v).encode('utf-8')
-)
-
-topic = "capstone"
-
-# Continuously send messages
-while True:
-    for msg in messages:
-        msg['timestamp'] = int(time.time())  # Update timestamp to current time
-        print(f"Sending: {msg}")
-        producer.send(topic, msg)
-        time.sleep(1)  # Send a message every second
+from bisect import bisect_left
+from collections import defaultdict
+
+# Load generator for the "capstone" topic. Payloads look like messages.json:
+# {"sender": emp_id, "receiver": emp_id, "message": "...", "timestamp": unix seconds}
+# Examples:
+#   python producer.py --rate 0 --count 1000000 --broker memory       # generator ceiling
+#   python producer.py --rate 20000 --duration 300 --flagged-ratio 0.05 --skew 1.1 \
+#       --linger-ms 20 --batch-size 262144 --compression lz4 --pg-dsn "dbname=postgres_capstone user=postgres"
+default_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dataset")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic message load for the flagging stream")
+    parser.add_argument("--broker", default="localhost:9092", help="bootstrap servers, or 'memory' for the in-process stand-in")
+    parser.add_argument("--topic", default="capstone")
+    parser.add_argument("--data-dir", default=default_data_dir)
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run, ignored when --count is set")
+    parser.add_argument("--count", type=int, default=None, help="total messages to send")
+    parser.add_argument("--flagged-ratio", type=float, default=0.1, help="share of messages containing a reserved word")
+    parser.add_argument("--skew", type=float, default=0.0, help="Zipf exponent for senders, 0 is uniform")
+    parser.add_argument("--words", type=int, default=8, help="words per message")
+    parser.add_argument("--message-pool", type=int, default=10000, help="distinct message bodies generated up front")
+    parser.add_argument("--batch-size", type=int, default=16384, help="producer batch.size in bytes")
+    parser.add_argument("--linger-ms", type=int, default=5)
+    parser.add_argument("--compression", default="none", choices=["none", "gzip", "snappy", "lz4", "zstd"])
+    parser.add_argument("--acks", default="1", choices=["0", "1", "all"])
+    parser.add_argument("--report-every", type=float, default=5, help="seconds between progress lines")
+    parser.add_argument("--pg-dsn", default=None, help="sample end-to-end lag from kafka_messages in this Postgres")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def load_inputs(data_dir):
+    with open(os.path.join(data_dir, "vocab.json"), "r") as file:
+        vocab = json.load(file)
+    with open(os.path.join(data_dir, "marked_word.json"), "r") as file:
+        reserved_words = json.load(file)
+    with open(os.path.join(data_dir, "employee_data.csv"), "r", newline="") as file:
+        emp_ids = [row["emp_id"] for row in csv.DictReader(file, delimiter="\t") if row.get("emp_id")]
+    reserved_set = set(reserved_words)
+    return [word for word in vocab if word not in reserved_set], reserved_words, emp_ids
+
+
+class PayloadFactory:
+    """Builds message payloads from a fixed pool of bodies and Zipf-skewed senders."""
+
+    def __init__(self, clean_vocab, reserved_words, emp_ids, flagged_ratio, skew, words, pool_size, seed):
+        self.rnd = random.Random(seed)
+        self.emp_ids = emp_ids
+
+        # Exactly round(ratio * pool) flagged bodies, so sampling keeps the ratio in expectation
+        flagged = round(flagged_ratio * pool_size)
+        self.bodies = []
+        for i in range(pool_size):
+            body = self.rnd.choices(clean_vocab, k=words)
+            if i < flagged:
+                body[self.rnd.randrange(words)] = self.rnd.choice(reserved_words)
+            self.bodies.append(" ".join(body))
+
+        # Rank r sends with weight 1 / r^skew, hot senders are a random subset of employees
+        ranked = emp_ids[:]
+        self.rnd.shuffle(ranked)
+        self.senders = ranked
+        total = 0.0
+        self.cum_weights = []
+        for rank in range(1, len(ranked) + 1):
+            total += 1.0 / rank ** skew
+            self.cum_weights.append(total)
+
+    def sender(self):
+        return self.senders[bisect_left(self.cum_weights, self.rnd.random() * self.cum_weights[-1])]
+
+    def make(self):
+        return {
+            "sender": self.sender(),
+            "receiver": self.rnd.choice(self.emp_ids),
+            "message": self.rnd.choice(self.bodies),
+            "timestamp": int(time.time())
+        }
+
+
+class _Delivered:
+    def __init__(self, partition, offset):
+        self.partition = partition
+        self.offset = offset
+
+
+class _DoneFuture:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def add_callback(self, fn, *args, **kwargs):
+        fn(*args, self.metadata, **kwargs)
+        return self
+
+    def add_errback(self, fn, *args, **kwargs):
+        return self
+
+
+class InMemoryProducer:
+    """Stand-in with the KafkaProducer calls used here, keeping records per partition in memory.
+
+    Serialisation and key partitioning still run, so it measures the cost of
+    the generator itself without a broker.
+    """
+
+    def __init__(self, value_serializer, key_serializer, partitions=4, **config):
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+        self.partitions = partitions
+        self.log = defaultdict(list)
+        self.bytes = 0
+
+    def send(self, topic, value=None, key=None):
+        key_bytes = self.key_serializer(key) if key is not None else None
+        value_bytes = self.value_serializer(value)
+        partition = hash(key_bytes) % self.partitions
+        records = self.log[(topic, partition)]
+        records.append((key_bytes, value_bytes))
+        self.bytes += len(value_bytes)
+        return _DoneFuture(_Delivered(partition, len(records) - 1))
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+def make_producer(args):
+    config = dict(
+        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        key_serializer=lambda k: k.encode("utf-8"),
+        batch_size=args.batch_size,
+        linger_ms=args.linger_ms,
+        compression_type=None if args.compression == "none" else args.compression,
+        acks=args.acks if args.acks == "all" else int(args.acks),
+    )
+    if args.broker == "memory":
+        return InMemoryProducer(**config)
+    from kafka import KafkaProducer
+    return KafkaProducer(bootstrap_servers=args.broker, **config)
+
+
+class Stats:
+    """Send/ack counters and ack latencies, updated from the producer's I/O thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.latencies = []
+
+    def on_ack(self, sent_at, metadata):
+        with self.lock:
+            self.acked += 1
+            self.latencies.append(time.perf_counter() - sent_at)
+
+    def on_error(self, exc):
+        with self.lock:
+            self.errors += 1
+
+    def drain_latencies(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return sorted(latencies)
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def sink_lag(dsn):
+    """Seconds between now and the newest message the stream has written to kafka_messages."""
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+
+    def sample():
+        with conn.cursor() as cur:
+            cur.execute("SELECT max(timestamp) FROM kafka_messages")
+            newest = cur.fetchone()[0]
+        return None if newest is None else time.time() - newest
+
+    return sample
+
+
+def main():
+    args = parse_args()
+    clean_vocab, reserved_words, emp_ids = load_inputs(args.data_dir)
+    factory = PayloadFactory(clean_vocab, reserved_words, emp_ids, args.flagged_ratio, args.skew,
+                             args.words, args.message_pool, args.seed)
+    producer = make_producer(args)
+    stats = Stats()
+    lag = sink_lag(args.pg_dsn) if args.pg_dsn else None
+
+    print(f"Sending to {args.broker}/{args.topic}: rate={args.rate or 'max'}/s, flagged={args.flagged_ratio}, "
+          f"skew={args.skew}, batch={args.batch_size}B, linger={args.linger_ms}ms, compression={args.compression}")
+
+    start = time.perf_counter()
+    last_report, last_sent = start, 0
+    while True:
+        now = time.perf_counter()
+        elapsed = now - start
+        if args.count is not None:
+            if stats.sent >= args.count:
+                break
+        elif elapsed >= args.duration:
+            break
+
+        # Send whatever the target rate says is due by now, in slices so the loop stays responsive
+        due = 1000 if not args.rate else int(args.rate * elapsed) - stats.sent
+        if args.count is not None:
+            due = min(due, args.count - stats.sent)
+        if due <= 0:
+            time.sleep(min(0.001, 1 / args.rate))
+            continue
+        for _ in range(min(due, 1000)):
+            payload = factory.make()
+            producer.send(args.topic, value=payload, key=payload["sender"]) \
+                .add_callback(stats.on_ack, time.perf_counter()) \
+                .add_errback(stats.on_error)
+            stats.sent += 1
+
+        if now - last_report >= args.report_every:
+            latencies = stats.drain_latencies()
+            line = (f"[{elapsed:7.1f}s] sent {stats.sent} ({(stats.sent - last_sent) / (now - last_report):.0f} msg/s), "
+                    f"acked {stats.acked}, errors {stats.errors}, "
+                    f"ack p50 {percentile(latencies, 0.5) * 1000:.1f}ms p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+            if lag:
+                sink = lag()
+                line += f", sink lag {'n/a' if sink is None else f'{sink:.1f}s'}"
+            print(line)
+            last_report, last_sent = now, stats.sent
+
+    producer.flush()
+    total = time.perf_counter() - start
+    latencies = stats.drain_latencies()
+    print(f"Done: {stats.sent} messages in {total:.1f}s ({stats.sent / total:.0f} msg/s), "
+          f"acked {stats.acked}, errors {stats.errors}, "
+          f"ack p50 {percentile(latencies, 0.5) * 1000:.1f}ms p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+    if isinstance(producer, InMemoryProducer):
+        print(f"In-memory log: {producer.bytes / 1e6:.1f} MB over {len(producer.log)} partitions")
+    producer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+from pyspark.sql.functions import *
+from pyspark.sql.streaming.state import GroupStateTimeout
+
+from pg_sink import get_pool
+from psycopg2.extras import execute_values
+from strike_ledger import (apply_cooldown, apply_strikes, deactivate_struck_sql, message_key_column,
+                           strike_stage_columns)
+
+# Same ledger as final_code2.py: every flagged message of an active employee is a
+# strike event, strike_summary holds the capped count, the month-start cooldown
+# takes strikes off and the MAX_STRIKES-th strike makes the employee INACTIVE.
+# The stream only adds events, so the counts follow the same rules as the batch.
+
+# Keyed state per sender: the messages already passed on to the ledger, until the watermark passes them
+strike_state_schema = "message_keys ARRAY<STRING>, event_ts ARRAY<LONG>"
+strike_output_schema = "sender LONG, event_ts LONG, message_key STRING"
+
+# New senders get their summary row with the salary of their open record
+add_new_senders_sql = """
+INSERT INTO strike_summary (sender, actual_salary)
+SELECT DISTINCT ON (st.sender) st.sender, e.salary
+FROM strike_stream_stage st
+JOIN emp_time_data e ON e.emp_id = st.sender::text AND e.status = 'ACTIVE' AND e.end_date IS NULL
+WHERE e.salary IS NOT NULL
+ON CONFLICT (sender) DO NOTHING
+"""
+
+
+def new_strikes(key, batches, state):
+    """Keyed state per sender: the message keys of its strikes already sent to the ledger.
+
+    A message delivered again while its key is held (a Kafka redelivery or a
+    replayed source) is dropped here instead of costing a trip to Postgres.
+    Keys are kept until the watermark passes their event time, when an
+    event-time timeout clears them, so the state per sender stays small. A
+    later copy still meets the ledger's unique message key.
+    """
+    sender = key[0]
+    held = dict(zip(state.get[0], state.get[1])) if state.exists else {}
+    watermark = state.getCurrentWatermarkMs() // 1000
+    held = {message_key: ts for message_key, ts in held.items() if ts >= watermark}
+
+    fresh_ts, fresh_keys = [], []
+    for pdf in batches:
+        for ts, message_key in zip(pdf["event_ts"].tolist(), pdf["message_key"].tolist()):
+            if message_key not in held:
+                held[message_key] = ts
+                fresh_ts.append(ts)
+                fresh_keys.append(message_key)
+
+    if held:
+        state.update((list(held), list(held.values())))
+        state.setTimeoutTimestamp((min(held.values()) + 1) * 1000)
+    else:
+        state.remove()
+
+    if fresh_keys:
+        yield pd.DataFrame({"sender": sender, "event_ts": fresh_ts, "message_key": fresh_keys})
+
+
+def apply_strike_events(rows, conn_params):
+    """One partition of new strike events into the ledger, in a single transaction.
+
+    The month-start cooldown of the partition's latest event time runs first,
+    as the batch job does before its strikes; strike_cooldowns makes sure only
+    one partition applies a month. Returns (events, employees struck, records closed).
+    """
+    rows = list(rows)
+    if not rows:
+        return 0, 0, 0
+    month = datetime.fromtimestamp(max(row.event_ts for row in rows), tz=timezone.utc).date().replace(day=1)
+    conn_pool = get_pool(conn_params, 2)
+    conn = conn_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            apply_cooldown(cur, month)
+            cur.execute(f"CREATE TEMP TABLE strike_stream_stage ({strike_stage_columns}) ON COMMIT DROP")
+            execute_values(
+                cur,
+                "INSERT INTO strike_stream_stage (sender, event_ts, message_key) VALUES %s",
+                [(row.sender, row.event_ts, row.message_key) for row in rows]
+            )
+            cur.execute(add_new_senders_sql)
+            struck = apply_strikes(cur, "strike_stream_stage")
+            cur.execute(deactivate_struck_sql)
+            closed = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn_pool.putconn(conn)
+    return len(rows), struck, closed
+
+
+def start_strike_query(df_flagged, conn_params, checkpoint_location, watermark="10 minutes"):
+    """Start the streaming query that adds strike events to the ledger as flagged messages arrive."""
+    strike_events = df_flagged.filter(col("flag")) \
+        .select(
+            col("sender").cast("long").alias("sender"),
+            col("timestamp").alias("event_ts"),
+            message_key_column(col("receiver"), col("message"), col("timestamp")).alias("message_key"),
+            timestamp_seconds(col("timestamp")).alias("event_time")
+        ) \
+        .filter(col("sender").isNotNull()) \
+        .withWatermark("event_time", watermark)
+
+    fresh_strikes = strike_events.groupBy("sender").applyInPandasWithState(
+        new_strikes,
+        outputStructType=strike_output_schema,
+        stateStructType=strike_state_schema,
+        outputMode="append",
+        timeoutConf=GroupStateTimeout.EventTimeTimeout
+    )
+
+    def write_strikes(batch_df, batch_id):
+        # Each partition holds whole senders and applies them over an executor's pooled connection
+        totals = batch_df.rdd.mapPartitions(
+            lambda rows: [apply_strike_events(rows, conn_params)]
+        ).fold((0, 0, 0), lambda a, b: tuple(x + y for x, y in zip(a, b)))
+        if totals[0]:
+            print(f"Strike batch {batch_id}: {totals[0]} events, {totals[1]} employees struck, "
+                  f"{totals[2]} records closed")
+
+    return fresh_strikes.writeStream \
+        .outputMode("append") \
+        .foreachBatch(write_strikes) \
+        .option("checkpointLocation", checkpoint_location) \
+        .trigger(processingTime='10 seconds') \
+        .start()
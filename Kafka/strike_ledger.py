@@ -0,0 +1,221 @@
+from datetime import datetime, timezone
+
+MAX_STRIKES = 10
+SALARY_FACTOR = 0.9
+
+# strike_table used to hold ten salary columns per employee. Now strikes are an
+# append-only event log plus one summary row per employee, and every strike
+# column is derived on read as actual_salary * 0.9^i.
+ledger_ddl = [
+    """
+    CREATE TABLE IF NOT EXISTS strike_summary (
+        sender bigint PRIMARY KEY,
+        actual_salary bigint NOT NULL,
+        num_of_strikes int NOT NULL DEFAULT 0,
+        load_time timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS strike_events (
+        event_id bigserial PRIMARY KEY,
+        sender bigint NOT NULL,
+        event_ts timestamp NOT NULL,
+        kind text NOT NULL,
+        delta int NOT NULL,
+        load_time timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS strike_events_sender_ts_idx ON strike_events (sender, event_ts)",
+    # Identifies the flagged message behind a STRIKE, events logged before it have none
+    "ALTER TABLE strike_events ADD COLUMN IF NOT EXISTS message_key text",
+    # A message is one strike, whichever engine or however many transactions stage it
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS strike_events_message_key ON strike_events (sender, message_key)
+    WHERE kind = 'STRIKE'
+    """,
+    # Only employees with strikes that are not frozen take part in a cooldown
+    f"""
+    CREATE INDEX IF NOT EXISTS strike_summary_cooling_idx ON strike_summary (sender)
+    WHERE num_of_strikes > 0 AND num_of_strikes < {MAX_STRIKES}
+    """,
+    # One row per month whose cooldown has been applied, so a rerun never cools down twice
+    """
+    CREATE TABLE IF NOT EXISTS strike_cooldowns (
+        month date PRIMARY KEY,
+        applied_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+# The old wide layout, kept as a view so existing readers see the same columns
+strike_view_sql = """
+CREATE OR REPLACE VIEW strike_table AS
+SELECT
+    sender,
+    actual_salary,
+    {strike_cols},
+    actual_salary * power({factor}::float8, num_of_strikes) AS current_salary,
+    num_of_strikes,
+    load_time
+FROM strike_summary
+""".format(
+    factor=SALARY_FACTOR,
+    strike_cols=",\n    ".join(
+        f"CASE WHEN num_of_strikes >= {i} THEN actual_salary * power({SALARY_FACTOR}::float8, {i}) END AS strike{i}"
+        for i in range(1, MAX_STRIKES + 1)
+    )
+)
+
+# Staged strikes, one row per flagged message: event_ts is the Kafka timestamp in unix
+# seconds and message_key is md5(receiver, message, timestamp) as message_key_column builds
+# it, so both engines stage the same values for the same message whatever their time zones
+strike_stage_columns = "sender bigint, event_ts bigint, message_key text"
+
+
+def message_key_column(receiver, message, timestamp):
+    """Spark column of the message key, from the raw Kafka timestamp (unix seconds)."""
+    from pyspark.sql.functions import concat_ws, md5
+    return md5(concat_ws("\u0001", receiver, message, timestamp.cast("string")))
+
+
+# Staged senders are locked in a fixed order first, so concurrent batches of the same
+# sender (the stream and the batch job) apply one after the other and each sees the
+# other's events and count
+lock_staged_senders_sql = """
+SELECT 1 FROM strike_summary WHERE sender IN (SELECT sender FROM {stage_table}) ORDER BY sender FOR UPDATE
+"""
+
+# Adds the staged strike events to the log and to the summary counts, capped at MAX_STRIKES.
+# A staged row is one flagged message, told apart by its message_key, so two messages in the
+# same second are two strikes while the same message staged twice, or seen again by a rerun
+# or by the other engine, is one; the unique index on (sender, message_key) backs that up.
+# Only the strikes that fit under the cap are logged, so sum(delta) per sender in
+# strike_events stays equal to num_of_strikes. event_ts is stored as UTC.
+add_strikes_sql = f"""
+WITH staged AS (
+    SELECT DISTINCT ON (sender, message_key)
+           sender, to_timestamp(event_ts) AT TIME ZONE 'UTC' AS event_ts, message_key
+    FROM {{stage_table}}
+    ORDER BY sender, message_key, event_ts
+),
+fresh AS (
+    SELECT st.sender, st.event_ts, st.message_key, s.num_of_strikes,
+           row_number() OVER (PARTITION BY st.sender ORDER BY st.event_ts, st.message_key) AS rn
+    FROM staged st
+    JOIN strike_summary s ON s.sender = st.sender
+    WHERE s.num_of_strikes < {MAX_STRIKES}
+      AND NOT EXISTS (
+        SELECT 1 FROM strike_events e
+        WHERE e.sender = st.sender AND e.kind = 'STRIKE' AND e.message_key = st.message_key
+    )
+),
+logged AS (
+    INSERT INTO strike_events (sender, event_ts, kind, delta, message_key)
+    SELECT sender, event_ts, 'STRIKE', 1, message_key FROM fresh
+    WHERE rn <= {MAX_STRIKES} - num_of_strikes
+    ON CONFLICT (sender, message_key) WHERE kind = 'STRIKE' DO NOTHING
+    RETURNING sender
+)
+UPDATE strike_summary s
+SET num_of_strikes = s.num_of_strikes + l.strikes, load_time = now()
+FROM (SELECT sender, count(*) AS strikes FROM logged GROUP BY sender) l
+WHERE s.sender = l.sender
+"""
+
+
+# Month-start cooldown: one strike less per month passed for everyone below MAX_STRIKES
+cooldown_sql = f"""
+WITH cooled AS (
+    UPDATE strike_summary s SET num_of_strikes = s.num_of_strikes - c.removed, load_time = now()
+    FROM (
+        SELECT sender, LEAST(num_of_strikes, %(months)s) AS removed FROM strike_summary
+        WHERE num_of_strikes > 0 AND num_of_strikes < {MAX_STRIKES}
+    ) c
+    WHERE s.sender = c.sender
+    RETURNING s.sender, c.removed
+)
+INSERT INTO strike_events (sender, event_ts, kind, delta)
+SELECT sender, %(month)s::timestamp, 'COOLDOWN', -removed FROM cooled
+"""
+
+# Closes the open emp_time_data record of every employee that reached MAX_STRIKES
+deactivate_struck_sql = f"""
+UPDATE emp_time_data e SET status = 'INACTIVE', end_date = CURRENT_DATE
+FROM strike_summary s
+WHERE e.emp_id = s.sender::text AND s.num_of_strikes >= {MAX_STRIKES}
+  AND e.status = 'ACTIVE' AND e.end_date IS NULL
+"""
+
+
+def ensure_strike_ledger(conn):
+    """Create the ledger tables, moving an old wide strike_table into strike_summary once."""
+    cur = conn.cursor()
+    try:
+        for ddl in ledger_ddl:
+            cur.execute(ddl)
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('strike_table')")
+        row = cur.fetchone()
+        if row is not None and row[0] == 'r':
+            cur.execute("""
+                INSERT INTO strike_summary (sender, actual_salary, num_of_strikes, load_time)
+                SELECT sender::bigint, actual_salary, COALESCE(num_of_strikes, 0), COALESCE(load_time, now())
+                FROM strike_table
+                ON CONFLICT (sender) DO NOTHING
+            """)
+            print(f"strike_summary migrated {cur.rowcount} rows from strike_table")
+            cur.execute("ALTER TABLE strike_table RENAME TO strike_table_legacy")
+        cur.execute(strike_view_sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def apply_cooldown(cur, month):
+    """Cool down for every month start up to `month` not applied yet; returns the employees cooled."""
+    cur.execute("SELECT max(month) FROM strike_cooldowns")
+    last = cur.fetchone()[0]
+    if last is not None and month <= last:
+        return 0
+    cur.execute("INSERT INTO strike_cooldowns (month) VALUES (%s) ON CONFLICT DO NOTHING", (month,))
+    if cur.rowcount == 0 or last is None:
+        # Another worker got there first, or this is the first month seen and only sets the baseline
+        return 0
+    months = (month.year - last.year) * 12 + month.month - last.month
+    cur.execute(cooldown_sql, {"month": month, "months": months})
+    return cur.rowcount
+
+
+def apply_strikes(cur, stage_table):
+    """Add the strikes staged in `stage_table` to the ledger; returns the employees struck."""
+    cur.execute(lock_staged_senders_sql.format(stage_table=stage_table))
+    cur.execute(add_strikes_sql.format(stage_table=stage_table))
+    return cur.rowcount
+
+
+def latest_event_time(conn):
+    """Kafka timestamp (unix seconds) of the newest message waiting in kafka_messages, or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT max(timestamp) FROM kafka_messages")
+        return cur.fetchone()[0]
+
+
+def run_cooldown(conn, event_time):
+    """The monthly cooldown as its own operation, driven by message event time and not the wall clock."""
+    if event_time is None:
+        return 0
+    month = datetime.fromtimestamp(int(event_time), tz=timezone.utc).date().replace(day=1)
+    cur = conn.cursor()
+    try:
+        cooled = apply_cooldown(cur, month)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    if cooled:
+        print(f"strike cooldown for {month}: {cooled} employees")
+    return cooled
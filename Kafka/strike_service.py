@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.active_index import ensure_active_index
+from common.emp_history import EmployeeHistoryIndex, ensure_history_changes
+from common.pg_io import PgIO
+from final_code2 import create_spark, pg_conn_params, pg_properties, pg_url, run_strike_batch
+from message_history import archive_history, ensure_history
+from pg_sink import get_pool
+from strike_ledger import ensure_strike_ledger, latest_event_time, run_cooldown
+
+# Seconds between self-scheduled ticks, 0 leaves ticking to POST /tick (cooldown_dag.py)
+TICK_INTERVAL_SECONDS = int(os.environ.get("STRIKE_TICK_SECONDS", "0"))
+SERVICE_HOST = os.environ.get("STRIKE_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("STRIKE_SERVICE_PORT", "8091"))
+POOL_SIZE = int(os.environ.get("STRIKE_POOL_SIZE", "2"))
+
+
+class StrikeService:
+    """Resident strike and cooldown worker.
+
+    The SparkSession and Postgres pool are created once at start-up and reused
+    by every tick, so a tick costs only the work on the new messages. Each
+    tick gets its own PgIO so its read/write report covers just that tick.
+    Ticks are serialised, a tick requested while one is running waits for it.
+
+    The employee history index is loaded once and refreshed by every tick, so
+    GET /employee/<emp_id>?as_of=YYYY-MM-DD and POST /lookup answer
+    point-in-time salary and designation questions as of the last tick.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        started = time.perf_counter()
+        self.spark = create_spark()
+        self.pool = get_pool(pg_conn_params, pool_size)
+
+        conn = self.pool.getconn()
+        try:
+            ensure_strike_ledger(conn)
+            ensure_history(conn)
+            ensure_active_index(conn)
+            ensure_history_changes(conn)
+            with conn.cursor() as cur:
+                self.history = EmployeeHistoryIndex.load(cur)
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+        self.lock = threading.Lock()
+        self.metrics = {
+            "startup_seconds": time.perf_counter() - started,
+            "ticks_total": 0,
+            "tick_failures_total": 0,
+            "tick_seconds_sum": 0.0,
+            "tick_seconds_max": 0.0,
+            "last_tick_seconds": 0.0,
+            "last_tick_timestamp": 0.0,
+            "cooldown_employees_total": 0,
+            "history_rows_archived_total": 0,
+        }
+        print(f"strike service started in {self.metrics['startup_seconds']:.1f}s")
+
+    def tick(self, reason="manual"):
+        """One strike pass; a failure is recorded and reported as {"status": "failed"}, not raised."""
+        with self.lock:
+            started = time.perf_counter()
+            conn = self.pool.getconn()
+            cooled = archived = 0
+            error = None
+            try:
+                cooled = run_cooldown(conn, latest_event_time(conn))
+                io = PgIO(self.spark, pg_url, pg_properties)
+                run_strike_batch(self.spark, io, conn, self.history)
+                # Months past the retention window leave Postgres for the Parquet archive
+                archived = archive_history(self.spark, io, conn)
+                io.report()
+            except Exception as e:
+                error = str(e)
+            finally:
+                # Nothing half-done goes back into the pool
+                conn.rollback()
+                self.pool.putconn(conn)
+            seconds = time.perf_counter() - started
+            self.metrics["ticks_total"] += 1
+            self.metrics["tick_seconds_sum"] += seconds
+            self.metrics["tick_seconds_max"] = max(self.metrics["tick_seconds_max"], seconds)
+            self.metrics["last_tick_seconds"] = seconds
+            self.metrics["last_tick_timestamp"] = time.time()
+            if error is None:
+                self.metrics["cooldown_employees_total"] += cooled
+                self.metrics["history_rows_archived_total"] += archived
+                print(f"strike tick ({reason}) done in {seconds:.2f}s")
+                return {"status": "ok", "reason": reason, "seconds": seconds, "cooled": cooled, "archived": archived}
+            self.metrics["tick_failures_total"] += 1
+            print(f"strike tick ({reason}) failed in {seconds:.2f}s: {error}")
+            return {"status": "failed", "reason": reason, "seconds": seconds, "error": error}
+
+    def lookup(self, emp_ids, as_of):
+        """As-of rows for many employees, ready for JSON (no NaN, dates as strings)."""
+        found = self.history.lookup_many(emp_ids, as_of)
+        found["as_of"] = found["as_of"].astype(str)
+        return found.astype(object).where(found.notna(), None).to_dict("records")
+
+    def prometheus(self):
+        return "".join(
+            f"strike_service_{name} {value}\n" for name, value in self.metrics.items()
+        )
+
+    def run_timer(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.tick("timer")
+            except Exception as e:
+                # Only a pool that hands out no connection gets here
+                print("strike tick failed:", e)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body, content_type="application/json"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                self._reply(200, service.prometheus(), "text/plain; version=0.0.4")
+            elif url.path == "/health":
+                self._reply(200, json.dumps({"status": "ok"}))
+            elif url.path.startswith("/employee/"):
+                try:
+                    as_of = parse_qs(url.query).get("as_of", [date.today().isoformat()])[0]
+                    found = service.history.lookup(int(url.path[len("/employee/"):]), as_of)
+                except ValueError as e:
+                    self._reply(400, json.dumps({"error": str(e)}))
+                    return
+                if found is None:
+                    self._reply(404, json.dumps({"error": "no record in effect on that day"}))
+                else:
+                    self._reply(200, json.dumps(found, default=str))
+            else:
+                self._reply(404, json.dumps({"error": "not found"}))
+
+        def do_POST(self):
+            if self.path == "/lookup":
+                # {"emp_ids": [...], "as_of": "YYYY-MM-DD" or one date per emp_id}
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    rows = service.lookup(body["emp_ids"], body.get("as_of", date.today().isoformat()))
+                except (KeyError, TypeError, ValueError) as e:
+                    self._reply(400, json.dumps({"error": str(e)}))
+                    return
+                self._reply(200, json.dumps(rows))
+                return
+            if self.path != "/tick":
+                self._reply(404, json.dumps({"error": "not found"}))
+                return
+            result = service.tick(self.headers.get("X-Tick-Reason", "http"))
+            self._reply(200 if result["status"] == "ok" else 500, json.dumps(result))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    service = StrikeService()
+    if TICK_INTERVAL_SECONDS > 0:
+        threading.Thread(target=service.run_timer, args=(TICK_INTERVAL_SECONDS,), daemon=True).start()
+
+    server = ThreadingHTTPServer((SERVICE_HOST, SERVICE_PORT), make_handler(service))
+    print(f"strike service listening on {SERVICE_HOST}:{SERVICE_PORT}")
+    server.serve_forever()
@@ -0,0 +1,183 @@
+import time
+
+import numpy as np
+import pandas as pd
+from pyspark.sql.functions import broadcast, col, lit
+
+from common.pg_publish import pg_transaction
+
+INDEX_TABLE = "active_emp_index"
+
+# The distinct emp_ids of the ACTIVE emp_time_data rows as one sorted big-endian
+# int64 array (8 bytes per employee), under a version that goes up on every rebuild
+_build_index_sql = f"""
+        UPDATE {INDEX_TABLE} SET
+            version = {INDEX_TABLE}.version + 1,
+            built_at = now(),
+            emp_count = a.emp_count,
+            ids = a.ids
+        FROM (
+            SELECT count(*) AS emp_count,
+                   coalesce(string_agg(int8send(emp_id), ''::bytea ORDER BY emp_id), ''::bytea) AS ids
+            FROM (
+                SELECT DISTINCT emp_id::text::bigint AS emp_id FROM emp_time_data
+                WHERE status = 'ACTIVE' AND emp_id::text ~ '^-?[0-9]+$'
+            ) e
+        ) a"""
+
+_trigger_function_sql = f"""
+CREATE OR REPLACE FUNCTION {INDEX_TABLE}_apply() RETURNS trigger AS $$
+DECLARE
+    changed boolean := false;
+BEGIN
+    -- Only statements that add or remove ACTIVE rows can change the set
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        changed := EXISTS (SELECT 1 FROM old_rows WHERE status = 'ACTIVE');
+    END IF;
+    IF NOT changed AND TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed := EXISTS (SELECT 1 FROM new_rows WHERE status = 'ACTIVE');
+    END IF;
+    IF changed THEN{_build_index_sql};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def ensure_active_index(conn):
+    """One-time setup of the published active-employee index on emp_time_data.
+
+    The index is built from the current emp_time_data and rebuilt by
+    statement-level triggers whenever a writer (the SCD2 rebuild, the strike
+    batch or the strike stream) adds or closes ACTIVE rows, in the same
+    transaction, so it never disagrees with the table.
+    """
+    with pg_transaction(conn) as cur:
+        cur.execute("SELECT to_regclass(%s)", (INDEX_TABLE,))
+        if cur.fetchone()[0] is not None:
+            return
+
+        # No writes to emp_time_data between the first build and the triggers
+        cur.execute("LOCK TABLE emp_time_data IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(f"""
+            CREATE TABLE {INDEX_TABLE} (
+                id boolean PRIMARY KEY DEFAULT true CHECK (id),
+                version bigint NOT NULL,
+                built_at timestamp NOT NULL DEFAULT now(),
+                emp_count bigint NOT NULL,
+                ids bytea NOT NULL
+            )
+        """)
+        cur.execute(f"INSERT INTO {INDEX_TABLE} (version, emp_count, ids) VALUES (0, 0, ''::bytea)")
+        cur.execute(_build_index_sql)
+        cur.execute(_trigger_function_sql)
+        for op, transitions in [
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ]:
+            cur.execute(f"""
+                CREATE TRIGGER {INDEX_TABLE}_{op.lower()}
+                AFTER {op} ON emp_time_data
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {INDEX_TABLE}_apply()
+            """)
+        cur.execute(f"SELECT emp_count FROM {INDEX_TABLE}")
+        print(f"{INDEX_TABLE} built with {cur.fetchone()[0]} active employees")
+
+
+def index_version(cur):
+    cur.execute(f"SELECT version FROM {INDEX_TABLE}")
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def load_active_index(cur):
+    """The published index as of the cursor's transaction, or None if it was never built."""
+    cur.execute(f"SELECT version, built_at, ids FROM {INDEX_TABLE}")
+    row = cur.fetchone()
+    if row is None:
+        return None
+    version, built_at, ids = row
+    return ActiveEmployeeIndex(version, built_at, np.frombuffer(bytes(ids), dtype=">i8").astype(np.int64))
+
+
+class ActiveEmployeeIndex:
+    """Sorted emp_ids of the active employees with the version they were published under."""
+
+    def __init__(self, version, built_at, ids):
+        self.version = version
+        self.built_at = built_at
+        self.ids = ids
+        self._df = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def contains(self, emp_ids):
+        """Vectorised membership of `emp_ids` (anything numpy turns into int64), by binary search."""
+        emp_ids = np.asarray(emp_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, emp_ids)
+        found = np.zeros(len(emp_ids), dtype=bool)
+        inside = pos < len(self.ids)
+        found[inside] = self.ids[pos[inside]] == emp_ids[inside]
+        return found
+
+    def dataframe(self, spark):
+        """The ids as a one-column DataFrame, made once and hinted for broadcast."""
+        if self._df is None:
+            self._df = broadcast(spark.createDataFrame(pd.DataFrame({"_active_emp_id": self.ids}), "_active_emp_id long"))
+        return self._df
+
+    def filter_active(self, spark, df, column="emp_id"):
+        """Rows of `df` whose `column` is an active employee, as a broadcast left semi join."""
+        return df.join(self.dataframe(spark), col(column).cast("long") == col("_active_emp_id"), "left_semi")
+
+    def flag_active(self, spark, df, column, flag_column):
+        """`df` with a boolean `flag_column` telling whether `column` is an active employee."""
+        ids = self.dataframe(spark).select(col("_active_emp_id").alias(f"_{flag_column}_id"), lit(True).alias(flag_column))
+        return df.join(ids, col(column).cast("long") == col(f"_{flag_column}_id"), "left") \
+            .drop(f"_{flag_column}_id") \
+            .fillna(False, subset=[flag_column])
+
+
+class ActiveIndexWatcher:
+    """Keeps a long-running job on the latest published index.
+
+    `current()` is cheap enough to call every micro-batch: it reads the
+    version at most every `poll_seconds`, and loads the ids again only when
+    the version moved. Until the index exists it returns None.
+    """
+
+    def __init__(self, conn_factory, poll_seconds=30):
+        self.conn_factory = conn_factory
+        self.poll_seconds = poll_seconds
+        self.index = None
+        self._conn = None
+        self._checked_at = 0.0
+
+    def current(self):
+        if time.monotonic() - self._checked_at < self.poll_seconds:
+            return self.index
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self.conn_factory()
+                self._conn.autocommit = True
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s)", (INDEX_TABLE,))
+                if cur.fetchone()[0] is not None:
+                    version = index_version(cur)
+                    if self.index is None or version != self.index.version:
+                        index = load_active_index(cur)
+                        print(f"{INDEX_TABLE}: version {index.version} loaded, {len(index)} active employees")
+                        self.index = index
+        except Exception as e:
+            # Keep working with the last index, Postgres is tried again next poll
+            print(f"{INDEX_TABLE}: reload failed, keeping version "
+                  f"{None if self.index is None else self.index.version}: {e}")
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._checked_at = time.monotonic()
+        return self.index
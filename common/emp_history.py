@@ -0,0 +1,344 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from common.pg_publish import pg_transaction
+
+CHANGES_TABLE = "emp_history_changes"
+
+# As in Kafka/strike_ledger.py: the salary shrinks by SALARY_FACTOR per strike, up to MAX_STRIKES
+MAX_STRIKES = 10
+SALARY_FACTOR = 0.9
+
+# Day number (days since 1970-01-01) standing in for an open end_date
+OPEN_END = np.iinfo(np.int32).max
+
+# Every statement on emp_time_data or strike_events logs the employees it touched
+# under its transaction id, so a reader can tell exactly which changes it has not seen
+_changes_ddl = f"""
+    CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+        txid bigint NOT NULL DEFAULT txid_current(),
+        emp_id text NOT NULL
+    )
+"""
+
+_trigger_functions_sql = [
+    f"""
+CREATE OR REPLACE FUNCTION {CHANGES_TABLE}_emp_time_data() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO {CHANGES_TABLE} (emp_id) SELECT DISTINCT emp_id::text FROM old_rows WHERE emp_id IS NOT NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {CHANGES_TABLE} (emp_id) SELECT DISTINCT emp_id::text FROM new_rows WHERE emp_id IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+    f"""
+CREATE OR REPLACE FUNCTION {CHANGES_TABLE}_strike_events() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO {CHANGES_TABLE} (emp_id) SELECT DISTINCT sender::text FROM new_rows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+]
+
+_triggers = [
+    ("emp_time_data", "INSERT", "NEW TABLE AS new_rows"),
+    ("emp_time_data", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ("emp_time_data", "DELETE", "OLD TABLE AS old_rows"),
+    # strike_events is append-only
+    ("strike_events", "INSERT", "NEW TABLE AS new_rows"),
+]
+
+_history_sql = """
+    SELECT emp_id::text::bigint AS emp_id, designation, start_date, end_date, salary, status
+    FROM emp_time_data
+    WHERE emp_id::text ~ '^-?[0-9]+$' AND start_date IS NOT NULL{where}
+"""
+
+_strikes_sql = """
+    SELECT sender, extract(epoch FROM event_ts)::bigint AS event_ts, delta, event_id
+    FROM strike_events{where}
+"""
+
+
+def ensure_history_changes(conn):
+    """Set up the change log the history index refreshes from.
+
+    Run it from both sides: the Glue jobs own emp_time_data and the Kafka
+    jobs own strike_events, so each missing trigger is added once its table
+    exists.
+    """
+    with pg_transaction(conn) as cur:
+        cur.execute(_changes_ddl)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {CHANGES_TABLE}_txid_idx ON {CHANGES_TABLE} (txid)")
+        for function_sql in _trigger_functions_sql:
+            cur.execute(function_sql)
+        for table, op, transitions in _triggers:
+            cur.execute("SELECT to_regclass(%s)", (table,))
+            if cur.fetchone()[0] is None:
+                continue
+            trigger = f"{CHANGES_TABLE}_{table}_{op.lower()}"
+            cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = %s", (trigger,))
+            if cur.fetchone() is not None:
+                continue
+            cur.execute(f"""
+                CREATE TRIGGER {trigger}
+                AFTER {op} ON {table}
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {CHANGES_TABLE}_{table}()
+            """)
+            print(f"{CHANGES_TABLE}: logging changes of {table} on {op}")
+
+
+def _copy_frame(cur, sql, params=None, parse_dates=None):
+    # COPY is far cheaper than fetching row tuples for a full history
+    query = cur.mogrify(sql, params).decode() if params is not None else sql
+    buf = io.StringIO()
+    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+    buf.seek(0)
+    return pd.read_csv(buf, parse_dates=parse_dates)
+
+
+def _days(values):
+    """Dates (anything pandas parses) as int32 days since 1970-01-01, NaT as OPEN_END."""
+    days = pd.to_datetime(pd.Series(values)).to_numpy(dtype="datetime64[D]")
+    out = np.full(len(days), OPEN_END, dtype=np.int32)
+    known = ~np.isnat(days)
+    out[known] = days[known].astype(np.int64)
+    return out
+
+
+def _composite(rank, value, bits):
+    return (rank.astype(np.int64) << bits) + value.astype(np.int64)
+
+
+def _history_state(history):
+    history = history.assign(
+        emp_id=history["emp_id"].astype(np.int64),
+        start_day=_days(history["start_date"]),
+        end_day=_days(history["end_date"]),
+        salary=history["salary"].astype(np.float64),
+        designation=history["designation"].astype("category"),
+        status=history["status"].astype("category"),
+    ).sort_values(["emp_id", "start_day", "end_day"], kind="stable", ignore_index=True)
+    emp_keys, first_rows = np.unique(history["emp_id"].to_numpy(), return_index=True)
+    ranks = np.repeat(np.arange(len(first_rows)), np.diff(np.append(first_rows, len(history))))
+    return {
+        "history": history,
+        "_emp_keys": emp_keys,
+        "_row_rank": ranks,
+        "_row_keys": _composite(ranks, history["start_day"].to_numpy(dtype=np.int64) - np.iinfo(np.int32).min, 32),
+        "_end_day": history["end_day"].to_numpy(),
+        "_salary": history["salary"].to_numpy(),
+        "_designation": history["designation"].cat.codes.to_numpy(),
+        # Code -1 (no value) picks the trailing None
+        "_designations": np.append(history["designation"].cat.categories.to_numpy(dtype=object), None),
+        "_status": history["status"].cat.codes.to_numpy(),
+        "_statuses": np.append(history["status"].cat.categories.to_numpy(dtype=object), None),
+    }
+
+
+def _strikes_state(strikes):
+    if strikes is None:
+        strikes = pd.DataFrame({"sender": [], "event_ts": [], "delta": [], "event_id": []})
+    strikes = strikes.astype(np.int64).sort_values(["sender", "event_ts", "event_id"], ignore_index=True)
+    strike_keys, first_rows = np.unique(strikes["sender"].to_numpy(), return_index=True)
+    sizes = np.diff(np.append(first_rows, len(strikes)))
+    ranks = np.repeat(np.arange(len(first_rows)), sizes)
+    # Running count per employee: the overall running sum minus the one before its first event
+    running = np.cumsum(strikes["delta"].to_numpy())
+    before = np.concatenate([[0], running])[first_rows]
+    return {
+        "strikes": strikes,
+        "_strike_keys": strike_keys,
+        "_strike_rank": ranks,
+        "_strike_ts_keys": _composite(ranks, strikes["event_ts"].to_numpy(), 34),
+        "_strike_count": np.clip(running - np.repeat(before, sizes), 0, MAX_STRIKES),
+    }
+
+
+class EmployeeHistoryIndex:
+    """Point-in-time lookups over the SCD2 history in emp_time_data.
+
+    The history is held per employee as intervals sorted by start_date. A
+    record is in effect on day D when start_date <= D < end_date (an open
+    end_date never ends), the same reading the headcount uses. Each
+    (employee, day) lookup is one binary search on (employee rank, start
+    day). Strikes come from strike_events as a running count per employee,
+    so the strike-adjusted salary on D is salary * SALARY_FACTOR ^ strikes
+    counted up to the end of D.
+
+    `load` reads everything once. `refresh` then only rereads the employees
+    logged in emp_history_changes by transactions the last read did not see,
+    and deletes the log entries every later refresh would skip anyway, so
+    there must be one refreshing index per database.
+
+    All arrays live in one dict that is never changed once built. A refresh
+    builds a new one and replaces `_state` in a single assignment, and every
+    lookup takes `_state` once up front, so lookups served from other
+    threads never mix arrays of two versions.
+    """
+
+    def __init__(self, history, strikes, snapshot=None):
+        self._state = {**_history_state(history), **_strikes_state(strikes), "snapshot": snapshot}
+
+    @classmethod
+    def load(cls, cur):
+        """The whole history and strike log, as of the cursor's connection now."""
+        # Taken first: anything committed after it is read again by the next refresh
+        cur.execute("SELECT txid_current_snapshot()::text")
+        snapshot = cur.fetchone()[0]
+        history = _copy_frame(cur, _history_sql.format(where=""), parse_dates=["start_date", "end_date"])
+        cur.execute("SELECT to_regclass('strike_events')")
+        has_strikes = cur.fetchone()[0] is not None
+        strikes = _copy_frame(cur, _strikes_sql.format(where="")) if has_strikes else None
+        return cls(history, strikes, snapshot)
+
+    def refresh(self, cur):
+        """Reread the employees changed since the last load or refresh; returns how many.
+
+        The log entries are pruned on the cursor's transaction, they are gone
+        once the caller commits.
+        """
+        old = self._state
+        cur.execute("SELECT txid_current_snapshot()::text")
+        snapshot = cur.fetchone()[0]
+        cur.execute(f"""
+            SELECT DISTINCT emp_id FROM {CHANGES_TABLE}
+            WHERE txid >= txid_snapshot_xmin(%(seen)s::txid_snapshot)
+              AND NOT txid_visible_in_snapshot(txid, %(seen)s::txid_snapshot)
+              AND emp_id ~ '^-?[0-9]+$'
+        """, {"seen": old["snapshot"]})
+        changed = [row[0] for row in cur.fetchall()]
+        state = dict(old, snapshot=snapshot)
+        if changed:
+            ids = np.array(changed, dtype=np.int64)
+            history = _copy_frame(cur, _history_sql.format(where=" AND emp_id::text = ANY(%(ids)s)"),
+                                  {"ids": changed}, parse_dates=["start_date", "end_date"])
+            state.update(_history_state(pd.concat([old["history"][~old["history"]["emp_id"].isin(ids)], history],
+                                                  ignore_index=True)))
+            cur.execute("SELECT to_regclass('strike_events')")
+            if cur.fetchone()[0] is not None:
+                strikes = _copy_frame(cur, _strikes_sql.format(where=" WHERE sender = ANY(%(ids)s)"),
+                                      {"ids": ids.tolist()})
+                state.update(_strikes_state(pd.concat([old["strikes"][~old["strikes"]["sender"].isin(ids)], strikes],
+                                                      ignore_index=True)))
+        # Transactions below the new snapshot's xmin have ended and their changes were
+        # read above or by an earlier refresh, no later refresh looks at them again
+        cur.execute(f"DELETE FROM {CHANGES_TABLE} WHERE txid < txid_snapshot_xmin(%s::txid_snapshot)", (snapshot,))
+        self._state = state
+        return len(changed)
+
+    def __getstate__(self):
+        # Broadcast copies only need the lookup arrays, not the frames kept for refreshes
+        state = dict(self._state)
+        state.pop("history", None)
+        state.pop("strikes", None)
+        return {"_state": state}
+
+    @staticmethod
+    def _locate(state, emp_ids, days):
+        """(found, record row, strikes) of each (emp_id, day) query, all by binary search."""
+        # Employee rank, then the last record starting on or before the day
+        emp_keys, row_rank = state["_emp_keys"], state["_row_rank"]
+        rank = np.searchsorted(emp_keys, emp_ids)
+        found = rank < len(emp_keys)
+        found[found] = emp_keys[rank[found]] == emp_ids[found]
+        row = np.searchsorted(state["_row_keys"], _composite(rank, days - np.iinfo(np.int32).min, 32), side="right") - 1
+        found &= row >= 0
+        found[found] = (row_rank[row[found]] == rank[found]) & (days[found] < state["_end_day"][row[found]])
+
+        # Strikes up to the end of the day: the last event before the next midnight
+        strike_keys = state["_strike_keys"]
+        strikes = np.zeros(len(emp_ids), dtype=np.int64)
+        srank = np.searchsorted(strike_keys, emp_ids)
+        struck = srank < len(strike_keys)
+        struck[struck] = strike_keys[srank[struck]] == emp_ids[struck]
+        event = np.searchsorted(state["_strike_ts_keys"], _composite(srank, (days + 1) * 86400, 34)) - 1
+        struck &= event >= 0
+        struck[struck] = state["_strike_rank"][event[struck]] == srank[struck]
+        strikes[struck] = state["_strike_count"][event[struck]]
+        return found, row, strikes
+
+    def lookup_many(self, emp_ids, as_of):
+        """Vectorised as-of lookups.
+
+        `emp_ids` and `as_of` are arrays of equal length, or `as_of` is one
+        date for all. Returns a DataFrame with one row per query, NaN/None
+        where the employee had no record in effect that day.
+        """
+        state = self._state
+        emp_ids = np.asarray(emp_ids, dtype=np.int64)
+        as_of = np.broadcast_to(np.asarray(as_of, dtype="datetime64[D]"), emp_ids.shape)
+        found, row, strikes = self._locate(state, emp_ids, as_of.astype(np.int64))
+        hit = row[found]
+
+        salary = np.full(len(emp_ids), np.nan)
+        salary[found] = state["_salary"][hit]
+        designation = np.full(len(emp_ids), None, dtype=object)
+        designation[found] = state["_designations"][state["_designation"][hit]]
+        status = np.full(len(emp_ids), None, dtype=object)
+        status[found] = state["_statuses"][state["_status"][hit]]
+
+        return pd.DataFrame({
+            "emp_id": emp_ids,
+            "as_of": as_of,
+            "designation": designation,
+            "salary": salary,
+            "status": status,
+            "strikes": strikes,
+            "adjusted_salary": salary * np.power(SALARY_FACTOR, strikes),
+        })
+
+    def lookup(self, emp_id, as_of):
+        """One employee on one day as a dict, or None if no record was in effect.
+
+        A record without a salary gives None for salary and adjusted_salary.
+        """
+        state = self._state
+        day = np.datetime64(as_of, "D")
+        found, row, strikes = self._locate(state, np.array([emp_id], dtype=np.int64),
+                                           np.array([day.astype(np.int64)]))
+        if not found[0]:
+            return None
+        i, salary = row[0], float(state["_salary"][row[0]])
+        salary = None if np.isnan(salary) else salary
+        return {
+            "emp_id": emp_id,
+            "as_of": day.item(),
+            "designation": state["_designations"][state["_designation"][i]],
+            "salary": salary,
+            "status": state["_statuses"][state["_status"][i]],
+            "strikes": int(strikes[0]),
+            "adjusted_salary": None if salary is None else salary * SALARY_FACTOR ** int(strikes[0]),
+        }
+
+    def lookup_frame(self, spark, df, emp_column="emp_id", date_column="as_of"):
+        """Spark DataFrame lookups: `df` gets the as-of columns, batch by batch on the executors.
+
+        The index travels once per executor as a broadcast variable.
+        """
+        from pyspark.sql.types import DoubleType, LongType, StringType, StructField, StructType
+
+        index = spark.sparkContext.broadcast(self)
+        out_schema = StructType(df.schema.fields + [
+            StructField("designation", StringType()),
+            StructField("salary", DoubleType()),
+            StructField("status", StringType()),
+            StructField("strikes", LongType()),
+            StructField("adjusted_salary", DoubleType()),
+        ])
+
+        def lookup_batches(batches):
+            for pdf in batches:
+                found = index.value.lookup_many(pdf[emp_column].astype(np.int64), pdf[date_column])
+                yield pdf.assign(**{c: found[c].to_numpy() for c in
+                                    ["designation", "salary", "status", "strikes", "adjusted_salary"]})
+
+        return df.mapInPandas(lookup_batches, out_schema)
@@ -0,0 +1,131 @@
+import sys
+import time
+from contextlib import contextmanager
+
+from common.s3_files import S3FileMover, make_s3_client
+
+BUCKET_NAME = "poc-bootcamp-capstone-group4"
+
+# The arguments the DAG passes to every job
+JOB_ARGS = [
+    'JOB_NAME',
+    'db_user',
+    'db_pass',
+    'db_host',
+    'pg_url',
+    'curr_ts',
+    'start_date',
+    'end_of_year',
+    'start_of_year',
+    'today',
+    'CURRENT_YEAR'
+]
+
+
+class GlueJobRuntime:
+    """What every Glue script needs, created only when the script first needs it.
+
+    The job arguments are resolved once. `pending_inputs` lists the bronze
+    prefix with boto3 before anything else is started, so a day without new
+    files never starts the JVM. The SparkContext/GlueContext/Job, the PgIO and
+    psycopg2 connections and the active-employee index are opened on first use. Each startup phase is timed
+    and `commit` prints the timings, so a no-op day shows where its seconds went.
+    """
+
+    def __init__(self, argv=None, arg_names=JOB_ARGS):
+        self.timings = []
+        self._job = None
+        self._spark = None
+        self._io = None
+        self._active_index = None
+        self._conns = []
+        with self.phase("resolve args"):
+            from awsglue.utils import getResolvedOptions
+            self.args = getResolvedOptions(argv or sys.argv, arg_names)
+        print("Received arguments:", {k: ("***" if k == "db_pass" else v) for k, v in self.args.items()})
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+    def pending_inputs(self, src_prefix, dest_prefix, bucket=BUCKET_NAME):
+        """The mover for `src_prefix` and its files still waiting to be processed."""
+        with self.phase("list inputs"):
+            mover = S3FileMover(make_s3_client(), bucket, src_prefix, dest_prefix,
+                                run_id=f"{self.args['JOB_NAME']}_{self.args['today']}")
+            keys = mover.pending()
+        if not keys:
+            print(f"No files found in s3://{bucket}/{src_prefix}, nothing to do.")
+        return mover, keys
+
+    @property
+    def spark(self):
+        if self._spark is None:
+            with self.phase("start spark"):
+                from pyspark.context import SparkContext
+                from awsglue.context import GlueContext
+                from awsglue.job import Job
+                glue_context = GlueContext(SparkContext.getOrCreate())
+                self._spark = glue_context.spark_session
+                self._job = Job(glue_context)
+                self._job.init(self.args['JOB_NAME'], self.args)
+        return self._spark
+
+    @property
+    def pg_properties(self):
+        return {
+            "user": self.args['db_user'],
+            "password": self.args['db_pass'],
+            "driver": "org.postgresql.Driver"
+        }
+
+    @property
+    def io(self):
+        if self._io is None:
+            from common.pg_io import PgIO
+            self._io = PgIO(self.spark, self.args['pg_url'], self.pg_properties)
+        return self._io
+
+    @property
+    def active_index(self):
+        """The published active-employee index, loaded once per job."""
+        if self._active_index is None:
+            from common.active_index import ensure_active_index, load_active_index
+            conn = self.pg_connect()
+            with self.phase("load active index"):
+                ensure_active_index(conn)
+                with conn.cursor() as cur:
+                    self._active_index = load_active_index(cur)
+                conn.rollback()
+            conn.close()
+            print(f"active employee index version {self._active_index.version}: {len(self._active_index)} employees")
+        return self._active_index
+
+    def pg_connect(self):
+        """A new psycopg2 connection to the capstone database, closed by `commit` if still open."""
+        with self.phase("connect postgres"):
+            import psycopg2
+            conn = psycopg2.connect(
+                dbname="postgres_capstone",
+                user=self.args['db_user'],
+                password=self.args['db_pass'],
+                host=self.args['db_host'],
+                port="5432"
+            )
+        self._conns.append(conn)
+        return conn
+
+    def commit(self):
+        """Report and commit whatever was started, then print the startup timings."""
+        for conn in self._conns:
+            if not conn.closed:
+                conn.close()
+        if self._io is not None:
+            self._io.report()
+        if self._job is not None:
+            self._job.commit()
+        print("[runtime] " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings))
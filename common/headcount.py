@@ -0,0 +1,105 @@
+from common.pg_publish import pg_transaction
+
+EVENTS_TABLE = "emp_designation_events"
+SNAPSHOT_TABLE = "active_employee_snapshot"
+REPORT_TABLE = "active_employee_report"
+
+# +1 on the day a record opens, -1 on the day it closes, summed per designation and day.
+# `rows` is a transition table of emp_time_data and `sign` undoes deleted or updated rows.
+_apply_events_sql = """
+        INSERT INTO {events} (designation, event_date, delta)
+        SELECT designation, event_date, {sign} * sum(delta) FROM (
+            SELECT designation, start_date AS event_date, 1 AS delta FROM {rows}
+            UNION ALL
+            SELECT designation, end_date, -1 FROM {rows} WHERE end_date IS NOT NULL
+        ) e
+        WHERE designation IS NOT NULL AND event_date IS NOT NULL
+        GROUP BY designation, event_date
+        ON CONFLICT (designation, event_date) DO UPDATE SET delta = {events}.delta + EXCLUDED.delta"""
+
+_trigger_function_sql = f"""
+CREATE OR REPLACE FUNCTION {EVENTS_TABLE}_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN{_apply_events_sql.format(events=EVENTS_TABLE, rows="old_rows", sign="-1")};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN{_apply_events_sql.format(events=EVENTS_TABLE, rows="new_rows", sign="1")};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def ensure_headcount_events(conn):
+    """One-time setup of the designation event ledger on emp_time_data.
+
+    The ledger is seeded from the current history and then kept up by
+    statement-level triggers, so every writer of emp_time_data (the SCD2
+    rebuild, the strike batch and the strike stream) records its open and
+    close events in the same transaction as the change itself.
+    """
+    with pg_transaction(conn) as cur:
+        cur.execute("SELECT to_regclass(%s)", (EVENTS_TABLE,))
+        if cur.fetchone()[0] is not None:
+            return
+
+        # No writes to emp_time_data between the seed and the triggers
+        cur.execute("LOCK TABLE emp_time_data IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(f"""
+            CREATE TABLE {EVENTS_TABLE} (
+                designation text NOT NULL,
+                event_date date NOT NULL,
+                delta bigint NOT NULL,
+                PRIMARY KEY (designation, event_date)
+            )
+        """)
+        cur.execute(_apply_events_sql.format(events=EVENTS_TABLE, rows="emp_time_data", sign="1"))
+        seeded = cur.rowcount
+        cur.execute(_trigger_function_sql)
+        for op, transitions in [
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ]:
+            cur.execute(f"""
+                CREATE TRIGGER {EVENTS_TABLE}_{op.lower()}
+                AFTER {op} ON emp_time_data
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {EVENTS_TABLE}_apply()
+            """)
+        print(f"{EVENTS_TABLE} seeded with {seeded} events")
+
+
+def snapshot_headcount(cur, as_of):
+    """Store the active headcount per designation as of `as_of` and refresh the latest report.
+
+    A record counts as active on day D when start_date <= D < end_date, the
+    half-open reading of the SCD2 history where a record ends the day its
+    successor starts.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+            as_of_date date NOT NULL,
+            designation text NOT NULL,
+            no_of_active_emp bigint NOT NULL,
+            PRIMARY KEY (as_of_date, designation)
+        )
+    """)
+    cur.execute(f"DELETE FROM {SNAPSHOT_TABLE} WHERE as_of_date = %(as_of)s::date", {"as_of": as_of})
+    cur.execute(f"""
+        INSERT INTO {SNAPSHOT_TABLE} (as_of_date, designation, no_of_active_emp)
+        SELECT %(as_of)s::date, designation, sum(delta)
+        FROM {EVENTS_TABLE}
+        WHERE event_date <= %(as_of)s::date
+        GROUP BY designation
+        HAVING sum(delta) > 0
+    """, {"as_of": as_of})
+    designations = cur.rowcount
+
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {REPORT_TABLE} (designation text, no_of_active_emp bigint)")
+    cur.execute(f"DELETE FROM {REPORT_TABLE}")
+    cur.execute(f"""
+        INSERT INTO {REPORT_TABLE} (designation, no_of_active_emp)
+        SELECT designation, no_of_active_emp FROM {SNAPSHOT_TABLE} WHERE as_of_date = %(as_of)s::date
+    """, {"as_of": as_of})
+    return designations
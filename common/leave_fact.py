@@ -0,0 +1,140 @@
+from common.pg_publish import pg_transaction
+
+FACT_TABLE = "emp_leave_fact"
+STATE_TABLE = "emp_leave_fact_state"
+ALERT_LEDGER_TABLE = "leave_alert_ledger"
+
+# Effective leave days per (emp_id, year): ACTIVE leaves on working days of
+# working_day_calendar. `availed` counts the days up to and including as_of,
+# `upcoming` the days from as_of on, so a leave on as_of itself is in both,
+# like the quota-usage and upcoming-leave checks have always counted it.
+# `rows` is emp_leave_data or one of its transition tables, `sign` undoes old rows.
+_apply_leave_days_sql = """
+        INSERT INTO {fact} AS f (emp_id, year, availed, upcoming)
+        SELECT r.emp_id, extract(year FROM c.date)::int,
+               {sign} * count(DISTINCT c.date) FILTER (WHERE c.date <= s.as_of),
+               {sign} * count(DISTINCT c.date) FILTER (WHERE c.date >= s.as_of)
+        FROM {rows} r
+        JOIN working_day_calendar c ON c.date = r.date::date AND c.is_working_day
+        CROSS JOIN {state} s
+        WHERE r.status = 'ACTIVE'
+        GROUP BY r.emp_id, extract(year FROM c.date)
+        ON CONFLICT (emp_id, year) DO UPDATE SET
+            availed = f.availed + EXCLUDED.availed,
+            upcoming = f.upcoming + EXCLUDED.upcoming"""
+
+_trigger_function_sql = f"""
+CREATE OR REPLACE FUNCTION {FACT_TABLE}_apply() RETURNS trigger AS $$
+BEGIN
+    -- Not built yet, or the calendar is being replaced: the next refresh rebuilds
+    IF NOT EXISTS (SELECT 1 FROM {STATE_TABLE}) OR to_regclass('working_day_calendar') IS NULL THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN{_apply_leave_days_sql.format(fact=FACT_TABLE, state=STATE_TABLE, rows="old_rows", sign="-1")};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN{_apply_leave_days_sql.format(fact=FACT_TABLE, state=STATE_TABLE, rows="new_rows", sign="1")};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def ensure_leave_fact(conn):
+    """One-time setup of the leave-day fact, the alert ledger and the emp_leave_data triggers.
+
+    The triggers turn every change to emp_leave_data (the daily merge of the
+    leave delta) into availed/upcoming deltas in the same transaction. The
+    fact itself is built by the first `refresh_leave_fact`.
+    """
+    with pg_transaction(conn) as cur:
+        cur.execute("SELECT to_regclass(%s)", (FACT_TABLE,))
+        if cur.fetchone()[0] is not None:
+            return
+
+        cur.execute("LOCK TABLE emp_leave_data IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(f"""
+            CREATE TABLE {FACT_TABLE} (
+                emp_id bigint NOT NULL,
+                year int NOT NULL,
+                availed int NOT NULL DEFAULT 0,
+                upcoming int NOT NULL DEFAULT 0,
+                PRIMARY KEY (emp_id, year)
+            )
+        """)
+        # as_of of the split, and the calendar the fact was built against
+        cur.execute(f"CREATE TABLE {STATE_TABLE} (as_of date NOT NULL, calendar_oid oid NOT NULL)")
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ALERT_LEDGER_TABLE} (
+                year int NOT NULL,
+                emp_id bigint NOT NULL,
+                leave_count int NOT NULL,
+                leave_quota int NOT NULL,
+                used_percent double precision NOT NULL,
+                alerted_at timestamp NOT NULL DEFAULT now(),
+                PRIMARY KEY (year, emp_id)
+            )
+        """)
+        cur.execute(_trigger_function_sql)
+        for op, transitions in [
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ]:
+            cur.execute(f"""
+                CREATE TRIGGER {FACT_TABLE}_{op.lower()}
+                AFTER {op} ON emp_leave_data
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {FACT_TABLE}_apply()
+            """)
+        print(f"{FACT_TABLE} and its emp_leave_data triggers created")
+
+
+def refresh_leave_fact(cur, as_of):
+    """Move the availed/upcoming split to `as_of`; returns "rolled", "rebuilt" or "current".
+
+    Moving forward only looks at the leaves dated between the old and the new
+    as_of. The fact is rebuilt from emp_leave_data when it has never been
+    built, when as_of moves backwards, or when working_day_calendar was
+    replaced since the last refresh (the calendar job overwrites the table,
+    which gives it a new oid).
+    """
+    params = {"as_of": as_of}
+    # No leave merges and no other refresh between reading the state and moving it
+    cur.execute("LOCK TABLE emp_leave_data IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute(f"SELECT as_of, calendar_oid FROM {STATE_TABLE}")
+    state = cur.fetchone()
+    cur.execute("SELECT to_regclass('working_day_calendar')::oid, %(as_of)s::date", params)
+    calendar_oid, as_of = cur.fetchone()
+    if calendar_oid is None:
+        raise ValueError("working_day_calendar is missing, run the leave calendar job first")
+
+    if state is not None and state[1] == calendar_oid and state[0] == as_of:
+        return "current"
+
+    if state is not None and state[1] == calendar_oid and state[0] < as_of:
+        previous = state[0]
+        cur.execute(f"""
+            WITH moved AS (
+                SELECT l.emp_id, extract(year FROM c.date)::int AS year,
+                       count(DISTINCT c.date) FILTER (WHERE c.date > %(previous)s) AS availed,
+                       count(DISTINCT c.date) FILTER (WHERE c.date < %(as_of)s) AS passed
+                FROM emp_leave_data l
+                JOIN working_day_calendar c ON c.date = l.date::date AND c.is_working_day
+                WHERE l.status = 'ACTIVE' AND c.date BETWEEN %(previous)s AND %(as_of)s
+                GROUP BY l.emp_id, extract(year FROM c.date)
+            )
+            UPDATE {FACT_TABLE} f
+            SET availed = f.availed + moved.availed, upcoming = f.upcoming - moved.passed
+            FROM moved WHERE f.emp_id = moved.emp_id AND f.year = moved.year
+        """, {"previous": previous, "as_of": as_of})
+        cur.execute(f"UPDATE {STATE_TABLE} SET as_of = %(as_of)s", params)
+        return "rolled"
+
+    cur.execute(f"DELETE FROM {STATE_TABLE}")
+    cur.execute(f"INSERT INTO {STATE_TABLE} (as_of, calendar_oid) VALUES (%(as_of)s, %(oid)s)",
+                {"as_of": as_of, "oid": calendar_oid})
+    cur.execute(f"DELETE FROM {FACT_TABLE}")
+    cur.execute(_apply_leave_days_sql.format(fact=FACT_TABLE, state=STATE_TABLE, rows="emp_leave_data", sign="1"))
+    print(f"{FACT_TABLE} rebuilt as of {as_of}: {cur.rowcount} (emp_id, year) rows")
+    return "rebuilt"
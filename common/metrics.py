@@ -0,0 +1,160 @@
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from pyspark.sql import Observation
+from pyspark.sql.functions import col, collect_list, count, lit, struct, to_json, when
+
+# METRICS_FORMAT=json|prometheus, METRICS_PATH=<file> (default stdout),
+# DEBUG_EMP_ID=<emp_id> turns on the debug samples
+METRICS_FORMAT = os.environ.get("METRICS_FORMAT", "json")
+METRICS_PATH = os.environ.get("METRICS_PATH")
+DEBUG_EMP_ID = os.environ.get("DEBUG_EMP_ID")
+
+
+def observed(observation, timeout):
+    # Observation.get blocks until an action has run over the DataFrame,
+    # a DataFrame that was never consumed reports nothing
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(observation.get), daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+    return result or None
+
+
+class JobMetrics:
+    """Row counts, stage timings, plans and spill for one Spark script, without extra Spark jobs.
+
+    Counts are observed metrics that ride on the actions the script already
+    runs. Each `stage` is tagged as a job group so its Spark stages, and their
+    spill, can be looked up in the status API afterwards. `emit` writes one
+    structured record per metric as JSON lines or Prometheus text.
+    """
+
+    def __init__(self, spark, job_name, fmt=METRICS_FORMAT, path=METRICS_PATH, debug_emp_id=DEBUG_EMP_ID):
+        self.spark = spark
+        self.job_name = job_name
+        self.fmt = fmt
+        self.path = path
+        self.debug_emp_id = debug_emp_id
+        self.observations = []
+        self.stages = []
+        self.plans = {}
+
+    def observe(self, df, name):
+        """Count the rows of `df` as they flow through whatever action consumes it next."""
+        observation = Observation(f"{name}_{len(self.observations)}")
+        self.observations.append((name, observation))
+        return df.observe(observation, count(lit(1)).alias("rows"))
+
+    def debug(self, df, name, key="emp_id"):
+        """Opt-in sample of DEBUG_EMP_ID's rows, collected by the next action over `df`."""
+        if not self.debug_emp_id:
+            return df
+        observation = Observation(f"debug_{name}_{len(self.observations)}")
+        self.observations.append((f"debug_{name}", observation))
+        match = col(key).cast("string") == lit(self.debug_emp_id)
+        return df.observe(
+            observation,
+            count(lit(1)).alias("rows"),
+            collect_list(when(match, to_json(struct(*df.columns)))).alias("sample")
+        )
+
+    def plan(self, df, name):
+        """Keep the physical plan of `df`; planning runs on the driver and starts no job."""
+        self.plans[name] = df._jdf.queryExecution().executedPlan().toString()
+        return df
+
+    @contextmanager
+    def stage(self, name):
+        sc = self.spark.sparkContext
+        group = f"{self.job_name}:{name}"
+        previous = sc.getLocalProperty("spark.jobGroup.id")
+        sc.setLocalProperty("spark.jobGroup.id", group)
+        sc.setLocalProperty("spark.job.description", name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"name": name, "group": group, "seconds": time.perf_counter() - start})
+            sc.setLocalProperty("spark.jobGroup.id", previous)
+            sc.setLocalProperty("spark.job.description", None)
+
+    def _stage_task_metrics(self):
+        # Spill and shuffle per job group from the status API, empty if the UI is off
+        sc = self.spark.sparkContext
+        if not sc.uiWebUrl:
+            return {}
+        base = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}"
+        try:
+            with urllib.request.urlopen(f"{base}/jobs", timeout=5) as response:
+                jobs = json.load(response)
+            with urllib.request.urlopen(f"{base}/stages", timeout=5) as response:
+                stages = {stage["stageId"]: stage for stage in json.load(response)}
+        except Exception as e:
+            print("[metrics] status API not available:", str(e))
+            return {}
+
+        totals = {}
+        for job in jobs:
+            group = totals.setdefault(job.get("jobGroup"), {
+                "memory_spilled_bytes": 0, "disk_spilled_bytes": 0, "shuffle_read_bytes": 0, "shuffle_write_bytes": 0
+            })
+            for stage_id in job.get("stageIds", []):
+                stage = stages.get(stage_id)
+                if stage is None:
+                    continue
+                group["memory_spilled_bytes"] += stage.get("memoryBytesSpilled", 0)
+                group["disk_spilled_bytes"] += stage.get("diskBytesSpilled", 0)
+                group["shuffle_read_bytes"] += stage.get("shuffleReadBytes", 0)
+                group["shuffle_write_bytes"] += stage.get("shuffleWriteBytes", 0)
+        return totals
+
+    def records(self, timeout=5):
+        records = []
+        for name, observation in self.observations:
+            values = observed(observation, timeout)
+            if values is None:
+                records.append({"metric": "rows", "name": name, "value": None, "note": "not consumed"})
+                continue
+            records.append({"metric": "rows", "name": name, "value": values["rows"]})
+            if "sample" in values:
+                records.append({"metric": "debug_sample", "name": name, "emp_id": self.debug_emp_id,
+                                "value": [json.loads(row) for row in values["sample"]]})
+
+        task_metrics = self._stage_task_metrics()
+        for stage in self.stages:
+            records.append({"metric": "stage_seconds", "name": stage["name"], "value": stage["seconds"]})
+            for metric, value in task_metrics.get(stage["group"], {}).items():
+                records.append({"metric": metric, "name": stage["name"], "value": value})
+        for name, plan in self.plans.items():
+            records.append({"metric": "physical_plan", "name": name, "value": plan})
+        return records
+
+    def _prometheus(self, records):
+        lines = []
+        for record in records:
+            if not isinstance(record["value"], (int, float)):
+                continue
+            name = record["name"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'spark_job_{record["metric"]}{{job="{self.job_name}",name="{name}"}} {record["value"]}')
+        return "\n".join(lines) + "\n"
+
+    def emit(self, timeout=5):
+        records = self.records(timeout)
+        if self.fmt == "prometheus":
+            text = self._prometheus(records)
+        else:
+            now = time.time()
+            text = "".join(json.dumps(dict(record, job=self.job_name, ts=now), default=str) + "\n" for record in records)
+
+        if self.path:
+            with open(self.path, "a") as file:
+                file.write(text)
+        else:
+            sys.stdout.write(text)
+        return records
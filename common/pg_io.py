@@ -0,0 +1,121 @@
+import copy
+import time
+from datetime import date
+
+from pyspark.sql import Observation
+from pyspark.sql.functions import count, lit
+
+from common.metrics import observed
+
+# How each table is split across executors. emp_id is stored as text in some
+# tables, so the range expression casts it; emp_leave_data splits on its date.
+RANGE_EXPRESSIONS = {
+    "emp_time_data": "emp_id::bigint",
+    "emp_data_trans": "emp_id::bigint",
+    "emp_leave_quota": "emp_id::bigint",
+    "emp_leave_data": "date::date",
+    "strike_table": "sender::bigint",
+    "strike_summary": "sender",
+}
+
+
+class PgIO:
+    """Parallel JDBC reads and batched writes against the capstone Postgres.
+
+    Reads of the big tables are split into `num_partitions` range predicates
+    so every executor pulls its own slice over its own connection, with an
+    optional `where` pushed down into every slice. Writes use large batches
+    and the driver's rewritten multi-row INSERTs. Row counts are collected
+    with observed metrics as the data flows, so reporting adds no Spark jobs.
+    """
+
+    def __init__(self, spark, pg_url, pg_properties, num_partitions=8, fetchsize=10000, batchsize=10000):
+        self.spark = spark
+        self.pg_url = pg_url
+        self.pg_properties = dict(pg_properties, fetchsize=str(fetchsize))
+        self.num_partitions = num_partitions
+        self.batchsize = batchsize
+        self.reads = []
+        self.writes = []
+
+    def _write_url(self):
+        sep = "&" if "?" in self.pg_url else "?"
+        return f"{self.pg_url}{sep}reWriteBatchedInserts=true"
+
+    def _bounds(self, table, expr, where):
+        query = f"(SELECT min({expr}) AS lo, max({expr}) AS hi FROM {table}{f' WHERE {where}' if where else ''}) AS bounds"
+        row = self.spark.read.jdbc(url=self.pg_url, table=query, properties=self.pg_properties).first()
+        return row["lo"], row["hi"]
+
+    def _range_predicates(self, table, expr, where, num_partitions):
+        lo, hi = self._bounds(table, expr, where)
+        if lo is None:
+            return [where or "1 = 1"]
+
+        is_date = isinstance(lo, date)
+        start, end = (lo.toordinal(), hi.toordinal()) if is_date else (int(lo), int(hi))
+        step = max((end - start + 1) // num_partitions, 1)
+
+        def to_sql(value):
+            return f"'{date.fromordinal(value).isoformat()}'" if is_date else str(value)
+
+        predicates = []
+        cut = start
+        while cut <= end:
+            upper = cut + step
+            if upper > end:
+                predicate = f"{expr} >= {to_sql(cut)}"
+            else:
+                predicate = f"{expr} >= {to_sql(cut)} AND {expr} < {to_sql(upper)}"
+            if not predicates:
+                # Rows the range expression cannot place go to the first slice
+                predicate = f"({predicate} OR {expr} IS NULL)"
+            predicates.append(f"{predicate} AND ({where})" if where else predicate)
+            cut = upper
+        return predicates
+
+    def read(self, table, where=None, num_partitions=None):
+        """Read `table`, split by its range expression and filtered by `where` in Postgres."""
+        num_partitions = num_partitions or self.num_partitions
+        expr = RANGE_EXPRESSIONS.get(table)
+
+        if expr and num_partitions > 1:
+            predicates = self._range_predicates(table, expr, where, num_partitions)
+            df = self.spark.read.jdbc(url=self.pg_url, table=table, predicates=predicates, properties=self.pg_properties)
+        else:
+            source = f"(SELECT * FROM {table} WHERE {where}) AS {table}" if where else table
+            df = self.spark.read.jdbc(url=self.pg_url, table=source, properties=self.pg_properties)
+
+        observation = Observation(f"read_{table}_{len(self.reads)}")
+        self.reads.append({"table": table, "partitions": df.rdd.getNumPartitions(), "observation": observation})
+        return df.observe(observation, count(lit(1)).alias("rows"))
+
+    def with_session_init(self, statement):
+        """A PgIO whose JDBC sessions run `statement` before reading, reporting into this one."""
+        io = copy.copy(self)
+        io.pg_properties = dict(self.pg_properties, sessionInitStatement=statement)
+        return io
+
+    def read_query(self, query, alias):
+        """Read the result of a SQL query, filtered entirely in Postgres."""
+        return self.spark.read.jdbc(url=self.pg_url, table=f"({query}) AS {alias}", properties=self.pg_properties)
+
+    def write(self, df, table, mode="append"):
+        observation = Observation(f"write_{table}_{len(self.writes)}")
+        start = time.perf_counter()
+        df.observe(observation, count(lit(1)).alias("rows")).write \
+            .option("batchsize", self.batchsize) \
+            .option("numPartitions", self.num_partitions) \
+            .jdbc(url=self._write_url(), table=table, mode=mode, properties=self.pg_properties)
+        seconds = time.perf_counter() - start
+        self.writes.append({"table": table, "seconds": seconds, "rows": observation.get["rows"]})
+
+    def report(self, timeout=5):
+        """Print per-table rows read, and rows, seconds and rows/s written."""
+        for read in self.reads:
+            values = observed(read["observation"], timeout)
+            rows = "not consumed" if values is None else f"{values['rows']} rows"
+            print(f"[pg_io] read  {read['table']}: {rows} over {read['partitions']} partitions")
+        for write in self.writes:
+            rate = write["rows"] / write["seconds"] if write["seconds"] else 0
+            print(f"[pg_io] write {write['table']}: {write['rows']} rows in {write['seconds']:.1f}s ({rate:.0f} rows/s)")
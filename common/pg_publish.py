@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def pg_transaction(conn):
+    """Run a block of statements as one transaction, rolled back on any error."""
+    cur = conn.cursor()
+    try:
+        yield cur
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def prepare_stage(conn, table, stage_table):
+    # Unlogged copy of the target's shape, recreated empty before every run
+    with pg_transaction(conn) as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {stage_table}")
+        cur.execute(f"CREATE UNLOGGED TABLE {stage_table} (LIKE {table} INCLUDING DEFAULTS)")
+
+
+def write_stage(df, stage_table, io):
+    io.write(df, stage_table, mode="append")
+
+
+def publish_table(df, table, io, conn):
+    """Replace `table` with the contents of `df` in one atomic step.
+
+    The rows are written once into `<table>_stage`, then the stage is renamed
+    into place inside a single transaction. If anything fails the transaction
+    rolls back and the live table is left as it was, and readers only ever
+    see the old or the new table. The stage is an ordinary logged table: an
+    unlogged one would have to be rewritten into the WAL by SET LOGGED under
+    an ACCESS EXCLUSIVE lock at publish time, while this way the WAL is
+    written as the rows load and the swap only takes the locks of the
+    renames. If `table` does not exist yet, the stage is created by the write
+    itself and published as the first version. Views and foreign keys
+    pointing at `table` follow the renamed old table, so they must not be
+    used on published tables.
+    """
+    stage_table = f"{table}_stage"
+    old_table = f"{table}_old"
+
+    with pg_transaction(conn) as cur:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        exists = cur.fetchone()[0] is not None
+        cur.execute(f"DROP TABLE IF EXISTS {stage_table}")
+        if exists:
+            cur.execute(f"CREATE TABLE {stage_table} (LIKE {table} INCLUDING ALL)")
+
+    write_stage(df, stage_table, io)
+
+    with pg_transaction(conn) as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {old_table}")
+        # Re-checked under this transaction, another run may have created it since
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is not None:
+            cur.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+        cur.execute(f"ALTER TABLE {stage_table} RENAME TO {table}")
+        cur.execute(f"DROP TABLE IF EXISTS {old_table}")
+
+    print(f"Published {table} through {stage_table}")
+
+
+def upsert_from_stage(cur, table, stage_table, key_cols, columns):
+    """INSERT ... ON CONFLICT DO UPDATE every staged row into `table`.
+
+    Rows that are not in the stage table are never touched, so the write
+    volume is the number of changed rows and not the size of the table.
+    """
+    keys = ", ".join(key_cols)
+    cols = ", ".join(columns)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c not in key_cols)
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_{'_'.join(key_cols)}_key ON {table} ({keys})")
+    cur.execute(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {stage_table}
+        ON CONFLICT ({keys}) DO UPDATE SET {updates}
+    """)
+    return cur.rowcount
+
+
+def update_from_stage(cur, table, stage_table, key_cols, columns, where=None):
+    """UPDATE only the rows of `table` that have a matching staged row."""
+    sets = ", ".join(f"{c} = s.{c}" for c in columns)
+    join = " AND ".join(f"t.{c} = s.{c}" for c in key_cols)
+    if where:
+        join = f"{join} AND {where}"
+    cur.execute(f"UPDATE {table} t SET {sets} FROM {stage_table} s WHERE {join}")
+    return cur.rowcount
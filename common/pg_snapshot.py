@@ -0,0 +1,52 @@
+class PgSnapshot:
+    """Source tables of one run, each read from Postgres once and all as of the same moment.
+
+    A REPEATABLE READ transaction on `conn` exports its snapshot, and every
+    JDBC session of the reads imports it, so the parallel slices of every
+    table see one point in time while the stream keeps inserting. Each table
+    is materialised with an eager local checkpoint: later stages reuse the
+    executor copy, and since the lineage no longer reaches the JDBC source an
+    evicted block cannot be recomputed from a newer state of the table. The
+    blocks are freed by Spark's context cleaner once the DataFrames are gone.
+
+    The snapshot is read-only: the holding transaction is READ ONLY and ends
+    on exit, so consuming what was read is up to the caller's own writes.
+    Use it as a context manager.
+    """
+
+    def __init__(self, io, conn):
+        self.conn = conn
+        self.tables = {}
+        self.cur = None
+        self.io = io
+
+    def __enter__(self):
+        # Start from a clean transaction, the isolation level must come before any query
+        self.conn.rollback()
+        self.cur = self.conn.cursor()
+        self.cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        self.cur.execute("SELECT pg_export_snapshot()")
+        snapshot_id = self.cur.fetchone()[0]
+        # Spark may switch autocommit off (and the driver open a transaction) before or
+        # after this runs, so it both begins and sets the isolation level explicitly
+        self.io = self.io.with_session_init(
+            "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY; "
+            "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY; "
+            f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"
+        )
+        return self
+
+    def read(self, table, where=None):
+        """`table` (filtered by `where` in Postgres) as of the snapshot, loaded on first use."""
+        key = (table, where)
+        if key not in self.tables:
+            self.tables[key] = self.io.read(table, where=where).localCheckpoint(eager=True)
+        return self.tables[key]
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            # Nothing was written, ending the transaction only releases the snapshot
+            self.conn.rollback()
+        finally:
+            self.cur.close()
+        return False
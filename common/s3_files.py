@@ -0,0 +1,144 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+# S3 allows at most 1000 keys per delete_objects call
+DELETE_BATCH = 1000
+
+
+def make_s3_client():
+    # S3_ENDPOINT_URL points the jobs at a local stand-in (moto, MinIO, LocalStack)
+    return boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
+
+
+class S3FileMover:
+    """Moves a run's input files from an unprocessed prefix to a processed one.
+
+    Listing is paginated, copies run on a bounded thread pool and sources are
+    removed with batched deletes. A JSON manifest under
+    `<src_prefix>_manifests/<run_id>.json` records which files (and ETags)
+    went into the run and which have been moved. Files a run has processed
+    but not yet removed from the source are also kept in
+    `<src_prefix>_manifests/processed.json`, shared by every run: `pending`
+    finishes moving those instead of handing them out again, whichever run or
+    attempt processed them. Both are saved after every copy/delete batch, so
+    a move that dies halfway leaves an exact record.
+    """
+
+    def __init__(self, s3, bucket, src_prefix, dest_prefix, run_id, max_workers=16):
+        self.s3 = s3
+        self.bucket = bucket
+        self.src_prefix = src_prefix
+        self.dest_prefix = dest_prefix
+        self.run_id = run_id
+        self.max_workers = max_workers
+        manifests = f"{src_prefix.rstrip('/')}_manifests"
+        self.manifest_key = f"{manifests}/{run_id}.json"
+        self.processed_key = f"{manifests}/processed.json"
+        self.manifest = self._load_json(self.manifest_key, {"run_id": self.run_id, "inputs": {}, "moved": []})
+        if isinstance(self.manifest["inputs"], list):
+            # Manifests written before ETags were recorded
+            self.manifest["inputs"] = dict.fromkeys(self.manifest["inputs"])
+        self.etags = {}
+
+    def _load_json(self, key, default):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+            return json.loads(body)
+        except self.s3.exceptions.NoSuchKey:
+            return default
+
+    def _save_json(self, key, value):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps(value, indent=2, sort_keys=True).encode("utf-8"),
+            ContentType="application/json"
+        )
+
+    def _save_manifest(self):
+        self._save_json(self.manifest_key, self.manifest)
+
+    def list_keys(self):
+        """Keys under the unprocessed prefix; their ETags are kept in `self.etags`."""
+        self.etags = {}
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.src_prefix):
+            for obj in page.get("Contents", []):
+                # Skip folder markers
+                if not obj["Key"].endswith("/"):
+                    self.etags[obj["Key"]] = obj["ETag"]
+        return list(self.etags)
+
+    def pending(self):
+        """Input files in the unprocessed prefix that no run has processed yet.
+
+        A file recorded as processed, by an earlier attempt of this run or by
+        any earlier run, with the same ETag is moved now rather than processed
+        again. A file uploaded again under the same name with new content has
+        another ETag and counts as new.
+        """
+        keys = self.list_keys()
+        processed = self._load_json(self.processed_key, {})
+        leftover = [key for key in keys if processed.get(key) == self.etags[key]]
+        fresh = [key for key in keys if processed.get(key) != self.etags[key]]
+        if leftover:
+            print(f"{len(leftover)} files in {self.src_prefix} were processed before, finishing their move")
+            self._move(leftover, processed)
+        return fresh
+
+    def paths(self, keys):
+        return [f"s3://{self.bucket}/{key}" for key in keys]
+
+    def record_inputs(self, keys):
+        self.manifest["inputs"].update({key: self.etags.get(key) for key in keys})
+        self._save_manifest()
+
+    def _copy(self, key):
+        destination_key = f"{self.dest_prefix}{key.split('/')[-1]}"
+        self.s3.copy_object(
+            Bucket=self.bucket,
+            CopySource={"Bucket": self.bucket, "Key": key},
+            Key=destination_key
+        )
+        return key
+
+    def _move(self, keys, processed):
+        # One DELETE_BATCH at a time: copy, delete, then record, so a failure loses at most the batch's record
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for start in range(0, len(keys), DELETE_BATCH):
+                batch = list(pool.map(self._copy, keys[start:start + DELETE_BATCH]))
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+                errors = response.get("Errors", [])
+                if errors:
+                    raise RuntimeError(f"Failed to delete {len(errors)} moved files, first: {errors[0]}")
+                self.manifest["moved"] = sorted(set(self.manifest["moved"]) | set(batch))
+                self._save_manifest()
+                for key in batch:
+                    processed.pop(key, None)
+                self._save_json(self.processed_key, processed)
+
+    def move(self, keys):
+        """Record `keys` as processed, then copy them to the processed prefix and delete the sources."""
+        moved = set(self.manifest["moved"])
+        keys = [key for key in keys if key not in moved]
+        if not keys:
+            print("No files left to move.")
+            return 0
+
+        # From here on a retry, or the next run, moves these instead of processing them again
+        processed = self._load_json(self.processed_key, {})
+        for key in keys:
+            etag = self.manifest["inputs"].get(key) or self.etags.get(key)
+            if etag is not None:
+                processed[key] = etag
+        self._save_json(self.processed_key, processed)
+
+        self._move(keys, processed)
+        print(f"Moved {len(keys)} files from {self.src_prefix} to {self.dest_prefix}")
+        return len(keys)
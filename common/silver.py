@@ -0,0 +1,95 @@
+import sys
+
+from pyspark.sql.functions import col, lit, to_date, year
+from pyspark.sql.types import DateType, IntegerType, LongType, StringType, StructField, StructType
+
+# Explicit schemas of the bronze CSV drops, shared by the Glue jobs and the local CLI below
+BRONZE_SCHEMAS = {
+    "emp_data": StructType([
+        StructField("name", StringType(), True),
+        StructField("age", IntegerType(), True),
+        StructField("emp_id", StringType(), True)
+    ]),
+    "emp_time_data": StructType([
+        StructField("emp_id", StringType(), True),
+        StructField("designation", StringType(), True),
+        StructField("start_date", LongType(), True),
+        StructField("end_date", LongType(), True),
+        StructField("salary", IntegerType(), True)
+    ]),
+    "emp_leave_data": StructType([
+        StructField("emp_id", LongType(), True),
+        StructField("date", StringType(), True),
+        StructField("status", StringType(), True)
+    ]),
+    "leave_quota": StructType([
+        StructField("emp_id", LongType(), True),
+        StructField("leave_quota", IntegerType(), True),
+        StructField("year", IntegerType(), True)
+    ]),
+}
+
+# Partition layout per dataset, coarsest first so year filters prune whole directories
+PARTITIONS = {
+    "emp_data": ["ingest_date"],
+    "emp_time_data": ["ingest_date"],
+    "emp_leave_data": ["year", "ingest_date"],
+    "leave_quota": ["year", "ingest_date"],
+}
+
+
+def silver_path(root, dataset):
+    return f"{root.rstrip('/')}/{dataset}"
+
+
+def read_bronze(spark, dataset, path, sep=","):
+    return spark.read.option("header", True).option("sep", sep).schema(BRONZE_SCHEMAS[dataset]).csv(path)
+
+
+def write_silver(df, dataset, ingest_date, root, compression="zstd"):
+    """Write one ingest day of `dataset` as compressed Parquet under `root` (s3://, file:// or a local path).
+
+    Only the partitions being written are replaced, so re-running a day is
+    idempotent and other days are left alone.
+    """
+    df = df.withColumn("ingest_date", lit(ingest_date).cast(DateType()))
+    if "year" in PARTITIONS[dataset] and "year" not in df.columns:
+        df = df.withColumn("year", year(to_date(col("date"))))
+
+    df.write \
+        .mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .option("compression", compression) \
+        .partitionBy(*PARTITIONS[dataset]) \
+        .parquet(silver_path(root, dataset))
+
+
+def read_silver(spark, dataset, root, ingest_from=None, ingest_to=None, years=None):
+    """Read `dataset` from silver, pruned to the given ingest-date range and years.
+
+    Filters on the partition columns prune directories, any further filter
+    the caller adds is pushed down into the Parquet scan.
+    """
+    df = spark.read.parquet(silver_path(root, dataset))
+    if ingest_from is not None:
+        df = df.filter(col("ingest_date") >= lit(ingest_from).cast(DateType()))
+    if ingest_to is not None:
+        df = df.filter(col("ingest_date") <= lit(ingest_to).cast(DateType()))
+    if years is not None:
+        df = df.filter(col("year").isin(list(years)))
+    return df
+
+
+if __name__ == "__main__":
+    # Offline bronze-to-silver run, e.g.
+    # python -m common.silver emp_data Dataset/employee_data.csv /tmp/silver 2024-01-01 "\t"
+    from pyspark.sql import SparkSession
+
+    dataset, bronze_path, root, ingest_date = sys.argv[1:5]
+    sep = sys.argv[5] if len(sys.argv) > 5 else ","
+
+    spark = SparkSession.builder.appName(f"bronze_to_silver_{dataset}").getOrCreate()
+    write_silver(read_bronze(spark, dataset, bronze_path, sep), dataset, ingest_date, root)
+    print(f"{dataset} written to {silver_path(root, dataset)}, ingest_date={ingest_date}")
+    read_silver(spark, dataset, root, ingest_from=ingest_date, ingest_to=ingest_date).show(5)
+    spark.stop()
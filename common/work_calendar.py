@@ -0,0 +1,61 @@
+from pyspark.sql import Window
+from pyspark.sql.functions import (
+    broadcast, col, dayofweek, explode, lit, sequence, sum as sum_, to_date, when, year
+)
+
+CALENDAR_TABLE = "working_day_calendar"
+
+
+def build_working_day_calendar(spark, holiday_df, start, end):
+    """One row per day from `start` to `end` with weekend/holiday/working flags.
+
+    `working_days_upto` is the running count of working days up to and
+    including the date, so any range count is a difference of two lookups.
+    """
+    holidays = holiday_df.select(to_date(col("date")).alias("date")).dropDuplicates() \
+        .withColumn("is_holiday", lit(True))
+
+    days = spark.range(1).select(
+        explode(sequence(lit(start).cast("date"), lit(end).cast("date"))).alias("date")
+    )
+
+    # The calendar is a few thousand rows, a single ordered window is enough
+    upto = Window.orderBy("date").rowsBetween(Window.unboundedPreceding, Window.currentRow)
+
+    return days.join(broadcast(holidays), on="date", how="left") \
+        .withColumn("is_weekend", dayofweek(col("date")).isin(1, 7)) \
+        .withColumn("is_holiday", col("is_holiday").isNotNull()) \
+        .withColumn("is_working_day", ~col("is_weekend") & ~col("is_holiday")) \
+        .withColumn("working_days_upto", sum_(when(col("is_working_day"), 1).otherwise(0)).over(upto)) \
+        .withColumn("year", year(col("date"))) \
+        .select("date", "year", "is_weekend", "is_holiday", "is_working_day", "working_days_upto")
+
+
+def load_working_day_calendar(io, start, end):
+    """Read the calendar rows for [start, end], rebuilding them from the holidays if the table is missing."""
+    where = f"date BETWEEN '{start.isoformat()}' AND '{end.isoformat()}'"
+    try:
+        calendar_df = io.read(CALENDAR_TABLE, where=where)
+    except Exception as e:
+        print(f"{CALENDAR_TABLE} not available, building it from emp_leave_calendar:", str(e))
+        holiday_df = io.read("emp_leave_calendar", where=where)
+        calendar_df = build_working_day_calendar(io.spark, holiday_df, start, end)
+    return calendar_df
+
+
+def working_days_between(calendar_df, start, end):
+    """Working days in [start, end] from two lookups on the prefix sums."""
+    rows = {
+        row["date"]: row
+        for row in calendar_df.filter(col("date").isin(start, end))
+            .select("date", "is_working_day", "working_days_upto").collect()
+    }
+    if start not in rows or end not in rows:
+        raise ValueError(f"{CALENDAR_TABLE} does not cover {start} to {end}")
+    first = rows[start]
+    return rows[end]["working_days_upto"] - first["working_days_upto"] + (1 if first["is_working_day"] else 0)
+
+
+def working_dates(calendar_df):
+    """Just the working dates, ready to be broadcast-joined against leave rows."""
+    return broadcast(calendar_df.filter(col("is_working_day")).select("date"))